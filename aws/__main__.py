@@ -2,6 +2,8 @@
 import argparse
 import sys
 
+from perfkit.arguments import positive_int
+
 from . import delete
 from . import inventory
 from . import launch
@@ -22,10 +24,14 @@ def main():
                                   help='ubuntu release to use, default: LTS')
     arg_create_group.add_argument('--ami',
                                   help='AMI to use e.g. ami-a3d3df39')
+    arg_create.add_argument('--count', type=positive_int, default=1,
+                            help='number of instances to launch')
 
     arg_delete = subparsers.add_parser('delete')
     arg_delete.add_argument('instance_ids', nargs='+',
                             help='instance ids to delete')
+    arg_delete.add_argument('--wait', action='store_true',
+                            help='wait for instances to terminate')
 
     arg_list = subparsers.add_parser('list')
     arg_list.add_argument('tag_filter', nargs='*',
@@ -39,6 +45,8 @@ def main():
     arg_stop = subparsers.add_parser('stop')
     arg_stop.add_argument('instance_ids', nargs='+',
                           help='instance ids to stop')
+    arg_stop.add_argument('--wait', action='store_true',
+                          help='wait for instances to stop')
 
     args = parser.parse_args()
     cmd = vars(args).pop('subcmd')
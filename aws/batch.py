@@ -0,0 +1,116 @@
+"""Act on many EC2 instances with as few API calls as possible."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import botocore
+import boto3
+
+MAX_IDS = 1000
+
+# errors that apply to every instance in a request, not to one of them
+ACCOUNT_ERRORS = [
+    'AuthFailure',
+    'Blocked',
+    'RequestLimitExceeded',
+    'UnauthorizedOperation',
+]
+
+
+def instance_action(action, instance_ids):
+    """Run a batch instance action such as terminate_instances.
+
+    All ids are sent in one request. If EC2 rejects an id the ids are
+    split in half and retried so every bad id is reported on its own
+    while the rest still get acted on. Returns the ids that failed.
+    """
+    client = boto3.client('ec2')
+    method = getattr(client, action)
+
+    failed = []
+    for start in range(0, len(instance_ids), MAX_IDS):
+        failed.extend(_bisect(method, instance_ids[start:start + MAX_IDS]))
+
+    return failed
+
+
+def _bisect(method, instance_ids):
+    """Call method on instance ids, splitting the batch on bad ids.
+
+    Account wide errors, such as throttling or failed authentication,
+    would hit every half as well, so they are reported once for the whole
+    batch. Any other error may come from a single instance, such as a bad
+    id or a termination protected instance, so the batch is split until
+    each failing id is found.
+    """
+    try:
+        method(InstanceIds=instance_ids)
+        return []
+    except botocore.exceptions.ClientError as error:
+        code = error.response['Error']['Code']
+        message = error.response['Error']['Message']
+        if code in ACCOUNT_ERRORS:
+            print('error: %s instances: %s' % (len(instance_ids), message))
+            return instance_ids
+        if len(instance_ids) == 1:
+            print('error: %s: %s' % (instance_ids[0], message))
+            return instance_ids
+
+    middle = len(instance_ids) // 2
+    halves = [instance_ids[:middle], instance_ids[middle:]]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = executor.map(lambda ids: _bisect(method, ids), halves)
+
+    return [instance_id for failed in results for instance_id in failed]
+
+
+def wait_for_state(instance_ids, states, timeout=600, max_delay=30,
+                   callback=None):
+    """Wait until all instances reach one of the given states.
+
+    All instances are checked with a single describe_instances request per
+    poll and the delay between polls doubles up to max_delay. If given,
+    callback is called with the description of each instance as soon as it
+    reaches the state. Returns the ids that did not reach the state before
+    the timeout.
+    """
+    client = boto3.client('ec2')
+    pending = list(instance_ids)
+    deadline = time.time() + timeout
+    delay = 1
+
+    while pending:
+        try:
+            instances = _describe(client, pending)
+        except botocore.exceptions.ClientError as error:
+            # new instances may not be visible to describe calls yet
+            if error.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                raise
+            instances = []
+
+        for instance in instances:
+            if instance['State']['Name'] in states:
+                pending.remove(instance['InstanceId'])
+                if callback:
+                    callback(instance)
+
+        if not pending or time.time() + delay > deadline:
+            break
+
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+    for instance_id in pending:
+        print('error: %s did not reach %s' % (instance_id, '/'.join(states)))
+
+    return pending
+
+
+def _describe(client, instance_ids):
+    """Return descriptions of the given instances."""
+    instances = []
+    paginator = client.get_paginator('describe_instances')
+    for page in paginator.paginate(InstanceIds=list(instance_ids)):
+        for reservation in page['Reservations']:
+            instances.extend(reservation['Instances'])
+
+    return instances
@@ -0,0 +1,104 @@
+"""Find and cache daily Ubuntu images."""
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+import boto3
+
+CACHE_PATH = os.path.expanduser('~/.cache/perfkit/images.json')
+CACHE_TTL = 6 * 60 * 60
+CANONICAL_OWNER = '099720109477'
+
+_LOG = logging.getLogger(__name__)
+
+
+class ImageCache(object):
+    """On-disk cache of resolved images shared by concurrent processes.
+
+    Entries are keyed by region and release and expire after ttl seconds.
+    The cache file is locked while an image is resolved so that parallel
+    runs wait for a single lookup instead of all querying EC2.
+    """
+
+    _thread_lock = threading.Lock()
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL):
+        """Init class."""
+        self.path = path
+        self.ttl = ttl
+
+    def get(self, release, resolve, region=None):
+        """Return cached image for release or resolve and store it."""
+        key = '%s/%s' % (region or _default_region(), release)
+
+        with self._locked() as data:
+            entry = data.get(key)
+            if entry and time.time() - entry['time'] < self.ttl:
+                return entry['image_id']
+
+            image_id = resolve(release)
+            data[key] = {'image_id': image_id, 'time': time.time()}
+
+        return image_id
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Lock the cache and yield its data, writing back any changes."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with self._thread_lock, open('%s.lock' % self.path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                with open(self.path) as cache:
+                    data = json.load(cache)
+            except (OSError, ValueError):
+                data = {}
+
+            before = dict(data)
+            yield data
+
+            if data != before:
+                tmp_path = '%s.%s' % (self.path, os.getpid())
+                with open(tmp_path, 'w') as cache:
+                    json.dump(data, cache, indent=4)
+                os.replace(tmp_path, self.path)
+
+
+def _default_region():
+    """Region boto3 uses when none is given."""
+    return boto3.session.Session().region_name
+
+
+def find_daily_image(release, region=None):
+    """Query EC2 for the latest daily image of a release."""
+    _LOG.info('searching for daily AMI of %s', release)
+    image_filter = ('ubuntu/images-testing/hvm-ssd/'
+                    'ubuntu-%s-daily-amd64-server-*' % (release))
+
+    client = boto3.session.Session().client('ec2', region_name=region)
+    kwargs = {
+        'Owners': [CANONICAL_OWNER],
+        'Filters': [{'Name': 'name', 'Values': [image_filter]}],
+    }
+
+    if client.can_paginate('describe_images'):
+        pages = client.get_paginator('describe_images').paginate(**kwargs)
+    else:
+        pages = [client.describe_images(**kwargs)]
+
+    images = [image for page in pages for image in page['Images']]
+    images = sorted(images, key=lambda k: k['CreationDate'])
+
+    return images[-1]['ImageId']
+
+
+def daily_image(release, region=None):
+    """Return the latest daily image of a release, using the cache."""
+    return ImageCache().get(
+        release, lambda name: find_daily_image(name, region), region
+    )
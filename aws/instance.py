@@ -5,14 +5,14 @@ class Ec2Instance(object):
     """Generic EC2 Instance class."""
 
     def __init__(self, instance):
-        """Init class."""
-        self.instance_id = instance.id
-        self.type = instance.instance_type
-        self.state = instance.state['Name']
-        self.ami = instance.image.id
-        self.ip_public = instance.public_ip_address
-        self.ip_private = instance.private_ip_address
-        self.owner = self._determine_owner(instance.tags)
+        """Init class from a describe_instances instance description."""
+        self.instance_id = instance['InstanceId']
+        self.type = instance['InstanceType']
+        self.state = instance['State']['Name']
+        self.ami = instance['ImageId']
+        self.ip_public = instance.get('PublicIpAddress')
+        self.ip_private = instance.get('PrivateIpAddress')
+        self.owner = self._determine_owner(instance.get('Tags'))
 
     @staticmethod
     def _determine_owner(tags):
@@ -10,16 +10,8 @@ from .instance import Ec2Instance
 
 def list_instances(tag_filter=None, csv_out=False, json_out=False):
     """List all EC2 instances."""
-    ec2 = boto3.resource('ec2')
-
-    if tag_filter:
-        results = ec2.instances.filter(
-            Filters=[{'Name': 'tag-value', 'Values': tag_filter}])
-    else:
-        results = ec2.instances.all()
-
     instances = []
-    for result in results:
+    for result in describe_instances(tag_filter):
         instances.append(Ec2Instance(result))
 
     instances = sorted(instances, key=lambda d: (d.state, d.owner, d.type))
@@ -36,3 +28,22 @@ def list_instances(tag_filter=None, csv_out=False, json_out=False):
             table.append(str(instance).split(' '))
         print(tabulate(table, headers=['id', 'type', 'state', 'ami',
                                        'ip_public', 'ip_private', 'owner']))
+
+
+def describe_instances(tag_filter=None):
+    """Yield instance descriptions using as few API calls as possible.
+
+    Tag filtering is done by EC2 and every field comes from the
+    describe_instances pages, so the number of requests only grows with
+    the number of 1000 instance pages.
+    """
+    client = boto3.client('ec2')
+    kwargs = {'PaginationConfig': {'PageSize': 1000}}
+    if tag_filter:
+        kwargs['Filters'] = [{'Name': 'tag-value', 'Values': tag_filter}]
+
+    paginator = client.get_paginator('describe_instances')
+    for page in paginator.paginate(**kwargs):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                yield instance
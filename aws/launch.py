@@ -1,25 +1,111 @@
 #!/usr/bin/env python3
 """Launch an AWS EC2 Instance."""
 import glob
+import hashlib
+import io
+import json
 import os
+import socket
 import sys
+import tarfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import botocore
 import boto3
 import distro_info
 import paramiko
+from tabulate import tabulate
 
+from .batch import wait_for_state
+from .images import daily_image
 
+MANIFEST = '.perfkit-manifest.json'
 
-def launch(instance_type, release, ami):
-    """Launch EC2 instance."""
+
+def launch(instance_type, release, ami, count=1):
+    """Launch EC2 instances and prepare them for testing.
+
+    All instances are created with one request. Each one is probed for SSH
+    and prepared as soon as it is running, without waiting for the rest.
+    Running is detected by wait_for_state rather than the EC2
+    instance_running waiter, which only returns once every instance is
+    running and polls at a fixed delay.
+    """
     if not ami:
         ami = get_daily_ubuntu_image_ami(release)
 
-    instance_id = launch_instance(instance_type, ami)
-    ip_addr = wait_for_instance(instance_id)
-    prep_instance(ip_addr)
+    start = time.time()
+    instance_ids = launch_instances(instance_type, ami, count)
+
+    print('waiting for %s instances' % len(instance_ids))
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(instance_ids)) as executor:
+        def on_running(instance):
+            """Start preparing an instance once it is running."""
+            results[instance['InstanceId']] = (
+                instance.get('PublicIpAddress'),
+                time.time() - start,
+                executor.submit(ready_instance,
+                                instance.get('PublicIpAddress'), start),
+            )
+
+        wait_for_state(instance_ids, ['running'], callback=on_running)
+
+    return report_launch(instance_ids, results)
+
+
+def report_launch(instance_ids, results):
+    """Print time to running and SSH per instance, return exit code."""
+    failed = 0
+    table = []
+    for instance_id in instance_ids:
+        if instance_id not in results:
+            failed += 1
+            table.append([instance_id, None, None, None])
+            continue
+
+        ip_addr, running, future = results[instance_id]
+        ssh = future.result()
+        if ssh is None:
+            failed += 1
+
+        table.append([instance_id, ip_addr, '%.1f' % running,
+                      None if ssh is None else '%.1f' % ssh])
+
+    print(tabulate(table, headers=['id', 'ip_public', 'running (s)',
+                                   'ssh (s)']))
+
+    return 1 if failed else 0
+
+
+def ready_instance(ip_addr, start):
+    """Wait for SSH, prepare the instance, and return seconds to SSH."""
+    if not ip_addr or not wait_for_port(ip_addr, 22):
+        print('error: %s never accepted SSH connections' % ip_addr)
+        return None
+
+    ssh = time.time() - start
+    if not prep_instance(ip_addr):
+        return None
+
+    return ssh
+
+
+def wait_for_port(ip_addr, port, timeout=300, max_delay=10):
+    """Probe a TCP port with an exponential backoff until it accepts."""
+    deadline = time.time() + timeout
+    delay = 1
+
+    while time.time() < deadline:
+        try:
+            socket.create_connection((ip_addr, port), timeout=5).close()
+            return True
+        except OSError:
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+    return False
 
 
 def get_daily_ubuntu_image_ami(release=None):
@@ -28,25 +114,16 @@ def get_daily_ubuntu_image_ami(release=None):
         release = distro_info.UbuntuDistroInfo().lts()
 
     print('searching for daily AMI of %s' % (release))
-    image_filter = ('ubuntu/images-testing/hvm-ssd/'
-                    'ubuntu-%s-daily-amd64-server-*' % (release))
-
-    session = boto3.session.Session()
-    client = session.client(service_name='ec2')
-    response = client.describe_images(Filters=[{'Name': 'name',
-                                                'Values': [image_filter]}])
-    images = sorted(response['Images'], key=lambda k: k['CreationDate'])
-
     try:
-        return images[-1]['ImageId']
+        return daily_image(release)
     except IndexError:
         print('error: cannot find daily image for "%s"' % (release))
         sys.exit(1)
 
 
-def launch_instance(instance_type, ami):
-    """Launch an instance, return id."""
-    print('launching %s with %s' % (instance_type, ami))
+def launch_instances(instance_type, ami, count=1):
+    """Launch instances with a single request, return ids."""
+    print('launching %s %s with %s' % (count, instance_type, ami))
     ec2 = boto3.resource('ec2')
     owner_tag = {
         'ResourceType': 'instance',
@@ -59,7 +136,8 @@ def launch_instance(instance_type, ami):
     }
 
     try:
-        instances = ec2.create_instances(MinCount=1, MaxCount=1, ImageId=ami,
+        instances = ec2.create_instances(MinCount=count, MaxCount=count,
+                                         ImageId=ami,
                                          KeyName=os.getlogin(),
                                          InstanceType=instance_type,
                                          TagSpecifications=[owner_tag])
@@ -67,7 +145,7 @@ def launch_instance(instance_type, ami):
         print('error: %s' % (error.response['Error']['Message']))
         sys.exit(1)
 
-    return instances[0].id
+    return [instance.id for instance in instances]
 
 
 def prep_instance(ip_addr):
@@ -80,61 +158,83 @@ def prep_instance(ip_addr):
     for _ in range(retries):
         try:
             client.connect(ip_addr, username='ubuntu')
-            push_test_scripts(client)
+            pushed = push_test_scripts(client)
             client.close()
-            return
+            return pushed
         except (TimeoutError, paramiko.ssh_exception.NoValidConnectionsError):
             time.sleep(10)
         except paramiko.ssh_exception.PasswordRequiredException:
             time.sleep(10)
 
-    print('error: could not SSH to instance after %s seconds' % (10 * retries))
-    sys.exit(1)
+    print('error: could not SSH to %s after %s seconds' %
+          (ip_addr, 10 * retries))
+    return False
+
+
+def push_test_scripts(client, test_script_dir='bin/'):
+    """Push test scripts to system under test, return False on failure.
+
+    Scripts are sent as one compressed tar stream that is unpacked by a
+    single remote command. A manifest of content hashes is kept on the
+    instance so pushing again only sends files that changed.
+    """
+    manifest = build_manifest(test_script_dir)
+    remote_manifest = read_remote_manifest(client)
+    changed = sorted(path for path, digest in manifest.items()
+                     if remote_manifest.get(path) != digest)
+
+    if not changed:
+        print('test scripts up to date')
+        return True
+
+    print('pushing %s changed test scripts' % len(changed))
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for path in changed:
+            tar.add(os.path.join(test_script_dir, path), arcname=path)
+
+        data = json.dumps(manifest, indent=4, sort_keys=True).encode()
+        info = tarfile.TarInfo(MANIFEST)
+        info.size = len(data)
+        info.mtime = time.time()
+        tar.addfile(info, io.BytesIO(data))
+
+    stdin, stdout, stderr = client.exec_command('tar -xzf -')
+    stdin.write(archive.getvalue())
+    stdin.channel.shutdown_write()
 
+    if stdout.channel.recv_exit_status():
+        print('error: failed to unpack test scripts: %s' %
+              stderr.read().decode().strip())
+        return False
 
-def push_test_scripts(client):
-    """Push test scripts to system under test."""
-    print('pushing test scripts')
-    sftp = client.open_sftp()
+    return True
 
-    test_script_dir = 'bin/'
+
+def build_manifest(test_script_dir):
+    """Map each test script path to the SHA-256 of its content and mode."""
+    manifest = {}
     for localfile in glob.glob('%s**/*' % test_script_dir, recursive=True):
-        remotefile = localfile.replace(test_script_dir, '')
         if os.path.isdir(localfile):
-            sftp.mkdir(remotefile)
-        else:
-            sftp.put(localfile, remotefile)
-            sftp.chmod(remotefile, os.stat(localfile).st_mode)
+            continue
 
-    sftp.close()
+        digest = hashlib.sha256()
+        with open(localfile, 'rb') as script:
+            digest.update(script.read())
+        digest.update(oct(os.stat(localfile).st_mode).encode())
 
+        manifest[os.path.relpath(localfile, test_script_dir)] = (
+            digest.hexdigest()
+        )
 
-def wait_for_instance(instance_id):
-    """Wait for instance to get to running state."""
-    print('waiting for instance')
-    session = boto3.session.Session()
-    client = session.client(service_name='ec2')
+    return manifest
 
-    retries = 12
-    for _ in range(retries):
-        response = client.describe_instance_status(InstanceIds=[instance_id])
 
-        try:
-            state = response['InstanceStatuses'][0]['InstanceState']['Name']
-
-            print(state)
-            if state == 'pending':
-                time.sleep(10)
-                continue
-            else:
-                ec2 = boto3.resource('ec2')
-                instance = ec2.Instance(instance_id)
-                return instance.public_ip_address
-
-        except IndexError:
-            time.sleep(10)
-            continue
+def read_remote_manifest(client):
+    """Return the manifest of the last push to the instance, if any."""
+    _, stdout, _ = client.exec_command('cat %s' % MANIFEST)
 
-    print('error: instance is not in running state after %s seconds' %
-          (retries * 10))
-    sys.exit(1)
+    try:
+        return json.loads(stdout.read().decode())
+    except ValueError:
+        return {}
@@ -1,20 +1,14 @@
 #!/usr/bin/env python3
 """Stop AWS EC2 instances."""
-import sys
+from .batch import instance_action, wait_for_state
 
-import botocore
-import boto3
 
-
-def stop(instance_ids=None):
+def stop(instance_ids=None, wait=False):
     """Stop AWS EC2 instances."""
-    ec2 = boto3.resource('ec2')
+    failed = instance_action('stop_instances', instance_ids)
 
-    for instance_id in instance_ids:
-        instance = ec2.Instance(instance_id)
+    if wait:
+        stopping = [i for i in instance_ids if i not in failed]
+        failed.extend(wait_for_state(stopping, ['stopped']))
 
-        try:
-            instance.stop()
-        except botocore.exceptions.ClientError as error:
-            print('error: %s' % (error.response['Error']['Message']))
-            sys.exit(1)
+    return 1 if failed else 0
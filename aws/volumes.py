@@ -0,0 +1,145 @@
+"""Create, attach, and remove EBS volumes of different types."""
+import collections
+import string
+
+import botocore
+import boto3
+
+# volume type, size in GiB, and optional IOPS and MiB/s throughput
+VolumeSpec = collections.namedtuple(
+    'VolumeSpec', 'type size iops throughput'
+)
+
+# performance included with the volume type when none is provisioned
+GP3_IOPS = 3000
+GP3_THROUGHPUT = 125
+
+
+def parse_volume_spec(text):
+    """Parse TYPE:SIZE[:IOPS[:THROUGHPUT]] such as gp3:100:6000:500.
+
+    Size is in GiB and throughput in MiB/s.
+    """
+    fields = text.split(':')
+    if len(fields) < 2 or len(fields) > 4:
+        raise ValueError('volume must be TYPE:SIZE[:IOPS[:THROUGHPUT]]')
+
+    numbers = [int(field) if field else None for field in fields[1:]]
+    numbers += [None] * (3 - len(numbers))
+
+    return VolumeSpec(fields[0], *numbers)
+
+
+def volume_label(spec):
+    """Return a short name for a volume spec."""
+    return ':'.join(str(value) for value in spec if value is not None)
+
+
+def provisioned(spec):
+    """Return the IOPS and MiB/s throughput a volume should deliver.
+
+    gp2 delivers 3 IOPS per GiB between 100 and 16000 IOPS, with
+    throughput of 128 MiB/s up to 170 GiB and 250 MiB/s above. gp3
+    defaults to 3000 IOPS and 125 MiB/s. io1 and io2 deliver their
+    provisioned IOPS and have no provisioned throughput, returned as None.
+    """
+    if spec.type == 'gp2':
+        return (
+            min(max(100, 3 * spec.size), 16000),
+            128 if spec.size <= 170 else 250
+        )
+    if spec.type == 'gp3':
+        return spec.iops or GP3_IOPS, spec.throughput or GP3_THROUGHPUT
+
+    return spec.iops, spec.throughput
+
+
+def create_volumes(specs, zone, tag='perfkit'):
+    """Create volumes in a zone and wait until all are available."""
+    client = boto3.client('ec2')
+
+    volume_ids = []
+    for spec in specs:
+        kwargs = {
+            'AvailabilityZone': zone,
+            'Size': spec.size,
+            'VolumeType': spec.type,
+            'TagSpecifications': [{
+                'ResourceType': 'volume',
+                'Tags': [{'Key': 'Name', 'Value': tag}],
+            }],
+        }
+        if spec.iops:
+            kwargs['Iops'] = spec.iops
+        if spec.throughput:
+            kwargs['Throughput'] = spec.throughput
+
+        volume_ids.append(client.create_volume(**kwargs)['VolumeId'])
+
+    client.get_waiter('volume_available').wait(VolumeIds=volume_ids)
+
+    return volume_ids
+
+
+def attach_volumes(instance_id, volume_ids):
+    """Attach volumes at free device names and wait until attached.
+
+    Returns the device name each volume was attached at by volume id.
+    """
+    client = boto3.client('ec2')
+    reservation = client.describe_instances(
+        InstanceIds=[instance_id]
+    )['Reservations'][0]
+    used = [
+        mapping['DeviceName']
+        for mapping in reservation['Instances'][0]['BlockDeviceMappings']
+    ]
+    free = [
+        '/dev/sd%s' % letter for letter in string.ascii_lowercase[5:]
+        if '/dev/sd%s' % letter not in used
+    ]
+
+    devices = dict(zip(volume_ids, free))
+    for volume_id, device in devices.items():
+        client.attach_volume(
+            Device=device, InstanceId=instance_id, VolumeId=volume_id
+        )
+
+    client.get_waiter('volume_in_use').wait(
+        VolumeIds=volume_ids,
+        Filters=[{'Name': 'attachment.status', 'Values': ['attached']}]
+    )
+
+    return devices
+
+
+def remove_volumes(volume_ids):
+    """Detach and delete volumes, returning the ids that failed."""
+    client = boto3.client('ec2')
+
+    for volume_id in volume_ids:
+        try:
+            client.detach_volume(VolumeId=volume_id)
+        except botocore.exceptions.ClientError as error:
+            # volumes that never got attached are already available
+            if error.response['Error']['Code'] != 'IncorrectState':
+                print('error: %s: %s' % (
+                    volume_id, error.response['Error']['Message']
+                ))
+
+    failed = []
+    try:
+        client.get_waiter('volume_available').wait(VolumeIds=volume_ids)
+    except botocore.exceptions.WaiterError as error:
+        print('error: volumes did not detach: %s' % error)
+
+    for volume_id in volume_ids:
+        try:
+            client.delete_volume(VolumeId=volume_id)
+        except botocore.exceptions.ClientError as error:
+            print('error: %s: %s' % (
+                volume_id, error.response['Error']['Message']
+            ))
+            failed.append(volume_id)
+
+    return failed
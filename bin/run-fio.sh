@@ -1,9 +1,9 @@
 #!/bin/bash
 # Run basic fio tests.
 #
-# I would love to make this more dynamic and remove
-# the need to have test files, do everything via the
-# CLI to make it more explicit.
+# Workloads come from the shared profile library in
+# fio/profiles.fio and all selected workloads run in a
+# single fio process.
 #
 # Copyright 2017 Canonical Ltd.
 # Joshua Powers <josh.powers@canonical.com>
@@ -18,9 +18,7 @@ bad_usage() { usage 1>&2; return 1; }
 
 trap cleanup EXIT
 cleanup() {
-    if [ -e test.0.0 ]; then
-        rm test.*.0
-    fi
+    rm -f fio.test.*
 }
 
 debug() {
@@ -39,25 +37,34 @@ Usage: ${0##*/} [ options ]
       -r | --read       Run read tests
       -w | --write      Run write tests
       -o | --random     Run random I/O instead of sequential I/O
+      -x | --mixed      Run a 70/30 random read and write mix
       -m | --md         Use /dev/md0 as target device
+      -d | --device DEV Use DEV, such as an NVMe or EBS volume, as target
 EOF
 }
 
 fio_test(){
-    local test=$1
+    local name=$1
     shift
 
-    filename="$LOG_DIR/$test-$(date +%s).json"
-    cmd="fio fio/$test.ini -output=$filename -output-format=json"
+    local sections=()
+    for section in "$@"; do
+        sections+=("--section=$section")
+    done
+
+    filename="$LOG_DIR/$name-$(date +%s).json"
+    cmd="fio fio/profiles.fio ${sections[*]}"
+    cmd="$cmd -output=$filename -output-format=json+"
+    "$(dirname "$0")/settle.sh" 60 ||
+        error "warning: running $name on a system that is not quiet"
     printf "%s\n%s\n" "$(date)" "$cmd"
     $cmd
     echo
-    sleep 10
 }
 
 main() {
-    local short_opts="hvrwom"
-    local long_opts="help,verbose,read,write,random,md"
+    local short_opts="hvrwoxmd:"
+    local long_opts="help,verbose,read,write,random,mixed,md,device:"
     local getopt_out=""
     getopt_out=$(getopt --name "${0##*/}" \
         --options "${short_opts}" --long "${long_opts}" -- "$@") ||
@@ -65,7 +72,7 @@ main() {
     eval set -- "${getopt_out}" ||
         { bad_usage; return; }
 
-    local read="" write="" random="" md=""
+    local read="" write="" random="" mixed="" device=""
     local cur=""
     while [ $# -ne 0 ]; do
         cur="$1";
@@ -75,14 +82,16 @@ main() {
             -r|--read) read=1;;
             -w|--write) write=1;;
             -o|--random) random=1;;
-            -m|--md) md=1;;
+            -x|--mixed) mixed=1;;
+            -m|--md) device="/dev/md0";;
+            -d|--device) device="$2"; shift;;
             --) shift; break;;
         esac
         shift;
     done
 
-    if [ -z "$read" ] && [ -z "$write" ]; then
-        echo "must specify either read or write"
+    if [ -z "$read" ] && [ -z "$write" ] && [ -z "$mixed" ]; then
+        echo "must specify read, write, or mixed"
         bad_usage
     fi
 
@@ -91,24 +100,36 @@ main() {
     fi
 
     prefix=""
-    if [ -n "$md" ]; then
-        echo "options: using /dev/md0"
-        prefix="${prefix}md0-"
+    if [ -n "$device" ]; then
+        echo "options: using $device"
+        prefix="$(basename "$device")-"
+        export FIO_FILENAME="$device" FIO_SIZE="100%" FIO_NUMJOBS=32
+    else
+        # one file per job, as fio names them without a filename
+        export FIO_FILENAME='fio.test.$jobnum' FIO_SIZE="1G" FIO_NUMJOBS=4
     fi
+    export FIO_BATCH=16
 
+    local rand="" sections=()
     if [ -n "$random" ]; then
         echo "options: using random I/O"
-        prefix="${prefix}random-"
+        rand="rand"
     fi
 
     if [ -n "$read" ]; then
-        fio_test "${prefix}read"
+        sections+=("${rand}read")
     fi
 
     if [ -n "$write" ]; then
-        fio_test "${prefix}write"
+        sections+=("${rand}write")
     fi
 
+    if [ -n "$mixed" ]; then
+        sections+=("randrw")
+    fi
+
+    fio_test "${prefix}$(IFS=-; echo "${sections[*]}")" "${sections[@]}"
+
     return 0
 }
 
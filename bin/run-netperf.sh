@@ -19,35 +19,45 @@ if [ ! -d "$LOG_DIR" ]; then
     mkdir -p "$LOG_DIR"
 fi
 
+STREAM_SELECTORS="THROUGHPUT,THROUGHPUT_UNITS,LOCAL_CPU_UTIL,REMOTE_CPU_UTIL"
+RR_SELECTORS="THROUGHPUT,THROUGHPUT_UNITS,P50_LATENCY,P90_LATENCY,P99_LATENCY"
+RR_SELECTORS="$RR_SELECTORS,MEAN_LATENCY,STDDEV_LATENCY"
+
 run_test() {
     local test="$1"
-    shift 1
+    local selectors="$2"
+    local options="${3:-}"
+    shift 2
 
     # -l: run for 600 seconds
     # -D: print interim results every 60 seconds
     # -c: print local CPU usage
     # -C: print remote CPU usage
     # -n: set the nubmer of CPUs
+    # -j: collect the latency statistics RR selectors ask for
+    # -k: print the selected omni output as KEY=VALUE lines
     cmd="sudo netperf -t $test -H $TARGET -l 600 -D 60 -c -C -n $CPUS"
+    cmd="$cmd $options -- -k $selectors"
 
     filename="$LOG_DIR/$test-$(date +%s).log"
     printf "%s\n%s\n" "$(date)" "$cmd" | tee "$filename"
     $cmd | tee -a "$filename"
 
     printf "\n\n"
-    sleep 60
+    "$(dirname "$0")/settle.sh" 120 ||
+        echo "warning: next test runs on a system that is not quiet" 1>&2
 }
 
 
 STREAM_TESTS=("TCP_STREAM" "TCP_MAERTS" "UDP_STREAM")
 for test in "${STREAM_TESTS[@]}"; do
     # -f: print in gigabits (only necessary for STREAM tests; not RR)
-    run_test "$test"
+    run_test "$test" "$STREAM_SELECTORS"
 done
 
 RR_TESTS=("TCP_RR" "UDP_RR")
 for test in "${RR_TESTS[@]}"; do
-    run_test "$test"
+    run_test "$test" "$RR_SELECTORS" "-j"
 done
 
 # vi: ts=4 noexpandtab
@@ -0,0 +1,50 @@
+#!/bin/bash
+# Wait for the system to be quiet instead of sleeping a fixed time.
+#
+# Quiet means over one interval the CPU is mostly idle, at most one task
+# is runnable, and no disk I/O is in flight. Gives up after max_wait
+# and exits 1 so callers can tell a timeout from a quiet system.
+set -eu
+
+MAX_WAIT=${1:-120}
+INTERVAL=${2:-5}
+
+cpu_times() {
+    # prints "busy total" jiffies from the aggregate cpu line
+    awk '/^cpu / {
+        total = 0
+        for (i = 2; i <= NF; i++) total += $i
+        print total - $5 - $6, total
+    }' /proc/stat
+}
+
+runnable() {
+    # the awk process reading loadavg is always running
+    awk '{ split($4, tasks, "/"); print tasks[1] - 1 }' /proc/loadavg
+}
+
+in_flight() {
+    awk '{ sum += $12 } END { print sum + 0 }' /proc/diskstats
+}
+
+start=$(date +%s)
+read -r busy total < <(cpu_times)
+while [ $(($(date +%s) - start)) -lt "$MAX_WAIT" ]; do
+    sleep "$INTERVAL"
+    read -r new_busy new_total < <(cpu_times)
+
+    # less than 5% of CPU time spent busy during the interval
+    if [ $(((new_busy - busy) * 20)) -le $((new_total - total)) ] &&
+        [ "$(runnable)" -le 1 ] && [ "$(in_flight)" -eq 0 ]; then
+        echo "settled after $(($(date +%s) - start))s"
+        exit 0
+    fi
+
+    busy=$new_busy
+    total=$new_total
+done
+
+echo "not settled after ${MAX_WAIT}s" 1>&2
+exit 1
+
+# vi: ts=4 noexpandtab
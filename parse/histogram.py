@@ -0,0 +1,93 @@
+"""Mergeable latency histograms."""
+import collections
+
+
+class LatencyHistogram(object):
+    """Latency distribution kept as sample counts per latency bin.
+
+    Bins are keyed by latency in nanoseconds, as in fio's json+ output.
+    Distributions from several jobs or iterations are combined by adding
+    the counts of matching bins, which unlike averaging percentiles gives
+    the true percentiles of all samples together.
+    """
+
+    def __init__(self, bins=None):
+        """Init class."""
+        self.bins = collections.Counter()
+        for latency, count in (bins or {}).items():
+            if count:
+                self.bins[int(latency)] += int(count)
+
+    def __add__(self, other):
+        """Return a new histogram with the samples of both."""
+        merged = LatencyHistogram(self.bins)
+        merged.merge(other)
+        return merged
+
+    def __len__(self):
+        """Return the number of samples."""
+        return sum(self.bins.values())
+
+    def merge(self, other):
+        """Add the samples of another histogram to this one."""
+        self.bins.update(other.bins)
+        return self
+
+    def mean(self):
+        """Return the mean latency in nanoseconds."""
+        count = len(self)
+        if not count:
+            return None
+
+        return sum(
+            latency * samples for latency, samples in self.bins.items()
+        ) / count
+
+    def percentile(self, percent):
+        """Return the latency below which percent of samples fall."""
+        return self.percentiles([percent])[percent]
+
+    def percentiles(self, percents):
+        """Return a dict of percent to latency with one walk of the bins."""
+        results = dict.fromkeys(percents)
+        count = len(self)
+        if not count:
+            return results
+
+        pending = sorted(percents)
+        seen = 0
+        for latency in sorted(self.bins):
+            seen += self.bins[latency]
+            while pending and seen >= count * pending[0] / 100:
+                results[pending.pop(0)] = latency
+            if not pending:
+                break
+
+        return results
+
+    def serialize(self):
+        """Return a compact text form of the histogram.
+
+        Bins are written in latency order as delta:count pairs where delta
+        is the increase in latency from the previous bin, which keeps the
+        numbers short for fio's closely spaced bins.
+        """
+        pairs = []
+        previous = 0
+        for latency in sorted(self.bins):
+            pairs.append('%s:%s' % (latency - previous, self.bins[latency]))
+            previous = latency
+
+        return ','.join(pairs)
+
+    @classmethod
+    def deserialize(cls, text):
+        """Return a histogram from the output of serialize."""
+        bins = {}
+        latency = 0
+        for pair in filter(None, text.strip().split(',')):
+            delta, count = pair.split(':')
+            latency += int(delta)
+            bins[latency] = int(count)
+
+        return cls(bins)
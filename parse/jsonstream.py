@@ -0,0 +1,229 @@
+"""Streaming JSON parser that keeps only selected paths."""
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 1 << 20
+
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+SCALAR = re.compile(r'[^\s,:\[\]{}"]+')
+# everything up to the next bracket outside of a string
+CONTENT = re.compile(r'(?:[^"\[\]{}]+|"(?:[^"\\]|\\.)*")*', re.DOTALL)
+WHITESPACE = re.compile(r'\s*')
+
+# a subtree that is kept whole
+WHOLE = None
+
+
+def select(stream, paths):
+    """Return the last JSON object in a stream with only some paths.
+
+    Paths are dotted keys such as 'jobs.*.read.iops', where * matches
+    every item of an array or key of an object, and a path ending early
+    keeps the whole value below it. The result has the shape of the
+    document with everything not selected left out. When a stream holds
+    several objects, as fio writes with --status-interval, the last is
+    returned.
+    """
+    document = None
+    found = False
+    for document in iter_select(stream, paths):
+        found = True
+
+    if not found:
+        raise ValueError('no JSON object found')
+
+    return document
+
+
+def iter_select(stream, paths):
+    """Yield each JSON object in a stream with only some paths.
+
+    Text between objects, such as warnings fio prints before its output,
+    is skipped.
+    """
+    tree = _path_tree(paths)
+    scanner = _Scanner(stream)
+    while scanner.find_object():
+        yield scanner.select(tree)
+
+
+def _path_tree(paths):
+    """Merge dotted paths into nested dicts of the keys to keep."""
+    tree = {}
+    for path in paths:
+        keys = path.split('.')
+        node = tree
+        for key in keys[:-1]:
+            if node.get(key, {}) is WHOLE:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = WHOLE
+
+    return tree
+
+
+class _Scanner(object):
+    """Read JSON from a stream chunk by chunk.
+
+    Values that are not selected are skipped by jumping from bracket to
+    bracket without building them, and selected values are decoded by
+    the json module.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        """Start reading a text or binary stream."""
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.mark = None
+        self.eof = False
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def find_object(self):
+        """Move to the start of the next object, False at the end."""
+        while True:
+            start = self.buffer.find('{', self.pos)
+            if start >= 0:
+                self.pos = start
+                return True
+            self.pos = len(self.buffer)
+            if not self._fill():
+                return False
+
+    def select(self, tree):
+        """Return the value at the current position keeping tree paths."""
+        char = self._peek()
+        if tree is WHOLE or char not in '{[':
+            return self._value()
+
+        self.pos += 1
+        if char == '{':
+            result = {}
+            while self._next_item('}'):
+                key = self._string()
+                self._expect(':')
+                if key in tree or '*' in tree:
+                    result[key] = self.select(tree.get(key, tree.get('*')))
+                else:
+                    self._skip()
+            return result
+
+        result = []
+        while self._next_item(']'):
+            if '*' in tree:
+                result.append(self.select(tree['*']))
+            else:
+                self._skip()
+        return result
+
+    def _next_item(self, close):
+        """Move past a separator, return False at the end of a container."""
+        char = self._peek()
+        if char == ',':
+            self.pos += 1
+            char = self._peek()
+        if char == close:
+            self.pos += 1
+            return False
+
+        return True
+
+    def _expect(self, char):
+        """Move past a character that must come next."""
+        if self._peek() != char:
+            raise ValueError(
+                'expected %r at %r' % (char, self.buffer[self.pos:][:20])
+            )
+        self.pos += 1
+
+    def _peek(self):
+        """Return the next character that is not whitespace."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('unexpected end of JSON')
+
+    def _string(self):
+        """Return the string at the current position."""
+        raw = self._match(STRING)
+        if '\\' in raw:
+            return json.loads(raw)
+
+        return raw[1:-1]
+
+    def _value(self):
+        """Return the complete value at the current position."""
+        self.mark = self.pos
+        try:
+            self._skip()
+            return json.loads(self.buffer[self.mark:self.pos])
+        finally:
+            self.mark = None
+
+    def _skip(self):
+        """Move past the value at the current position."""
+        char = self._peek()
+        if char == '"':
+            self._match(STRING)
+            return
+        if char not in '{[':
+            self._match(SCALAR)
+            return
+
+        depth = 0
+        while True:
+            self.pos = CONTENT.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer) or self.buffer[self.pos] == '"':
+                # the content or a string continues in the next chunk
+                if not self._fill():
+                    raise ValueError('unexpected end of JSON')
+                continue
+
+            depth += 1 if self.buffer[self.pos] in '{[' else -1
+            self.pos += 1
+            if depth == 0:
+                return
+
+    def _match(self, pattern):
+        """Move past a token, reading more when it may continue."""
+        while True:
+            found = pattern.match(self.buffer, self.pos)
+            if found and (found.end() < len(self.buffer) or self.eof):
+                self.pos = found.end()
+                return found.group()
+            if not self._fill():
+                if found:
+                    continue
+                raise ValueError(
+                    'invalid JSON at %r' % self.buffer[self.pos:][:20]
+                )
+
+    def _fill(self):
+        """Read the next chunk, dropping text that is no longer needed."""
+        if self.eof:
+            return False
+
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            end = not chunk
+            if isinstance(chunk, bytes):
+                # a chunk may end part way into a multibyte character
+                chunk = self.decoder.decode(chunk, final=end)
+            if chunk or end:
+                break
+        if not chunk:
+            self.eof = True
+            return False
+
+        keep = self.pos if self.mark is None else self.mark
+        self.buffer = self.buffer[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+
+        return True
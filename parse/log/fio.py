@@ -1,9 +1,33 @@
 """Parse FIO results."""
-import json
+from ..histogram import LatencyHistogram
+from ..jsonstream import select
+
+# completion latency percentiles requested from and reported by fio
+PERCENTILES = [50, 99, 99.9, 99.99]
+PERCENTILE_LIST = ':'.join('%g' % percent for percent in PERCENTILES)
+
+# the parts of fio output that are read, everything else such as the
+# submission and total latency bins of json+ output is skipped
+FIO_PATHS = [
+    'disk_util.*.util',
+    'jobs.*.jobname',
+    'jobs.*.job options',
+    'jobs.*.job_runtime',
+    'jobs.*.steadystate',
+] + [
+    'jobs.*.%s.%s' % (direction, field)
+    for direction in ('read', 'write', 'trim')
+    for field in ('iops', 'bw', 'io_bytes', 'clat_ns', 'clat')
+]
 
 
 class FioLog(object):
-    """FIO Parsing Object."""
+    """FIO Parsing Object.
+
+    A log holds one or more workloads, such as the sections of the
+    profile library run in one fio process, and each direction of each
+    workload is reported on its own line.
+    """
 
     name = 'fio'
 
@@ -12,29 +36,71 @@ class FioLog(object):
         filename = log_path.split('/')[-1]
         self.date = filename.split('-')[-1].replace('.json', '')
 
-        if 'read' in filename:
-            self.type = 'read'
-        else:
-            self.type = 'write'
+        data = load_fio_json(log_path)
 
-        if 'random' in filename:
-            self.test = '%s-%s' % (self.type, 'random')
-        else:
-            self.test = self.type
+        disk_util_mean = self._calc_disk_mean(data['disk_util'])
 
-        with open(log_path) as json_data:
-            data = json.load(json_data)
+        self.results = []
+        for job in data['jobs']:
+            options = job.get('job options', {})
+            readwrite = options.get('rw', options.get('readwrite'))
+            if not readwrite:
+                # logs from before the profile library named the test
+                readwrite = 'read' if 'read' in filename else 'write'
+                if 'random' in filename:
+                    readwrite = 'rand%s' % readwrite
 
-        self.iops = data['jobs'][0][self.type]['iops']
-        self.bandwidth = data['jobs'][0][self.type]['bw']
-        self.io_bytes = data['jobs'][0][self.type]['io_bytes']
-        self.disk_util_mean = self._calc_disk_mean(data['disk_util'])
+            for direction, test in self._tests(readwrite, options.get('bs')):
+                clat, histogram = completion_latency(
+                    dict(data, jobs=[job]), direction
+                )
+                self.results.append({
+                    'test': test,
+                    'iops': job[direction]['iops'],
+                    'bandwidth': job[direction]['bw'],
+                    'io_bytes': job[direction]['io_bytes'],
+                    'disk_util_mean': disk_util_mean,
+                    'clat': clat,
+                    'histogram': histogram,
+                })
 
     def __str__(self):
         """Return CSV of results."""
-        return '%s,%s,%s,%s,%s,%s,%s' % (self.name, self.date, self.test,
-                                         self.iops, self.bandwidth,
-                                         self.io_bytes, self.disk_util_mean)
+        lines = []
+        for result in self.results:
+            clat = [
+                '' if result['clat'][percent] is None
+                else result['clat'][percent] / 1000
+                for percent in PERCENTILES
+            ]
+
+            lines.append('%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s' % (
+                self.name, self.date, result['test'], result['iops'],
+                result['bandwidth'], result['io_bytes'],
+                result['disk_util_mean'], *clat
+            ))
+
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _tests(readwrite, block_size=None):
+        """Return the directions and test names of a fio I/O pattern."""
+        if readwrite in ('rw', 'readwrite', 'randrw'):
+            tests = [('read', 'read-mixed'), ('write', 'write-mixed')]
+        else:
+            direction = 'write' if 'write' in readwrite else 'read'
+            test = direction
+            if readwrite.startswith('rand'):
+                test = '%s-random' % direction
+            tests = [(direction, test)]
+
+        if block_size:
+            tests = [
+                (direction, '%s-%s' % (test, block_size))
+                for direction, test in tests
+            ]
+
+        return tests
 
     @staticmethod
     def _calc_disk_mean(disks):
@@ -44,3 +110,48 @@ class FioLog(object):
             total = total + disk['util']
 
         return total / len(disks)
+
+
+def load_fio_json(path):
+    """Return the fields of fio JSON output that the parsers use.
+
+    The file is streamed, so large json+ output with many jobs is never
+    held in memory as a whole.
+    """
+    with open(path, 'rb') as json_data:
+        return select(json_data, FIO_PATHS)
+
+
+def completion_latency(data, direction):
+    """Return clat percentiles and histogram of all jobs in fio output.
+
+    Latencies are in nanoseconds. The histogram merges the json+ bins of
+    every job and is empty if fio did not write json+ output. With a
+    single job, or group reporting, the percentiles are those fio
+    reported, otherwise they are taken from the merged histogram.
+    """
+    histogram = LatencyHistogram()
+    reported = {}
+    for job in data['jobs']:
+        stats = job[direction].get('clat_ns')
+        scale = 1
+        if stats is None:
+            # fio before 3.0 reported microseconds
+            stats = job[direction].get('clat', {})
+            scale = 1000
+
+        reported = {
+            float(percent): value * scale
+            for percent, value in stats.get('percentile', {}).items()
+        }
+        histogram.merge(LatencyHistogram({
+            int(latency) * scale: count
+            for latency, count in stats.get('bins', {}).items()
+        }))
+
+    if len(data['jobs']) > 1 and histogram.bins:
+        return histogram.percentiles(PERCENTILES), histogram
+
+    return {
+        percent: reported.get(float(percent)) for percent in PERCENTILES
+    }, histogram
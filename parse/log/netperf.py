@@ -1,8 +1,101 @@
 """Parse netperf results."""
+import re
+
+# omni output selectors printed with -k, latencies are in microseconds
+# and only measured when netperf runs with -j
+STREAM_SELECTORS = [
+    'THROUGHPUT', 'THROUGHPUT_UNITS', 'LOCAL_CPU_UTIL', 'REMOTE_CPU_UTIL'
+]
+LATENCY_SELECTORS = [
+    'P50_LATENCY', 'P90_LATENCY', 'P99_LATENCY', 'MEAN_LATENCY',
+    'STDDEV_LATENCY'
+]
+RR_SELECTORS = ['THROUGHPUT', 'THROUGHPUT_UNITS'] + LATENCY_SELECTORS
+
+# interim results printed with -D
+INTERIM = re.compile(
+    r'^Interim result:\s+([\d.]+)\s+\S+\s+over\s+([\d.]+)\s+seconds'
+    r'\s+ending at\s+([\d.]+)'
+)
+
+
+def selectors(test):
+    """Return the omni output selectors to request for a netperf test."""
+    if test.endswith('_RR'):
+        return RR_SELECTORS
+
+    return STREAM_SELECTORS
+
+
+def global_options(test):
+    """Return the global netperf options a test needs for its selectors."""
+    if test.endswith('_RR'):
+        return ['-j']
+
+    return []
+
+
+def measured(keyed, key):
+    """Return a keyed value as a float, None if it was not measured.
+
+    netperf prints a negative placeholder for statistics it did not
+    collect, such as latencies without -j.
+    """
+    value = keyed.get(key)
+    if not isinstance(value, float) or value < 0:
+        return None
+
+    return value
+
+
+def keyed_output(text):
+    """Return the KEY=VALUE lines of netperf -k output as a dict.
+
+    Numeric values are converted to floats. Other lines, such as the
+    test banner and interim results, are ignored.
+    """
+    fields = {}
+    for line in text.splitlines():
+        key, separator, value = line.strip().partition('=')
+        if not separator or not key.isupper() or ' ' in key:
+            continue
+
+        try:
+            fields[key] = float(value)
+        except ValueError:
+            fields[key] = value
+
+    return fields
+
+
+def interim_results(text):
+    """Return the interim results of netperf -D output.
+
+    Each result is the seconds from the start of the test to the end of
+    its interval and the throughput over the interval.
+    """
+    results = []
+    start = None
+    for line in text.splitlines():
+        match = INTERIM.match(line.strip())
+        if not match:
+            continue
+
+        value, interval, end = [float(field) for field in match.groups()]
+        if start is None:
+            start = end - interval
+        results.append((end - start, value))
+
+    return results
 
 
 class NetperfLog(object):
-    """Netperf Parsing Object."""
+    """Netperf Parsing Object.
+
+    Logs with keyed output from omni selectors are read by key, older
+    logs by the position of the result in the last lines. Interim
+    results are kept in order as pairs of seconds and throughput.
+    """
 
     name = 'netperf'
 
@@ -16,7 +109,17 @@ class NetperfLog(object):
         with open(log_path) as log:
             lines = log.read()
 
-        if self.test == 'RR':
+        self.interim = interim_results(lines)
+        keyed = keyed_output(lines)
+        self.latency = []
+        if 'THROUGHPUT' in keyed:
+            self.result = keyed['THROUGHPUT']
+            if self.test == 'RR':
+                self.latency = [
+                    '' if measured(keyed, key) is None else keyed[key]
+                    for key in LATENCY_SELECTORS
+                ]
+        elif self.test == 'RR':
             self.result = self._get_result(lines, -3, 5)
         elif self.protocol == 'UDP':
             self.result = self._get_result(lines, -4, 5)
@@ -30,7 +133,11 @@ class NetperfLog(object):
         return ' '.join(results.split()).split(' ')[field]
 
     def __str__(self):
-        """Return CSV of results."""
+        """Return CSV of results.
+
+        Request/response results read by key add p50, p90, p99, mean, and
+        standard deviation of latency in microseconds.
+        """
         if self.test == 'STREAM':
             test_type = 'Send'
         elif self.test == 'MAERTS':
@@ -38,5 +145,6 @@ class NetperfLog(object):
         elif self.test == 'RR':
             test_type = 'RR'
 
-        return '%s,%s,%s,%s,%s' % (self.name, self.date, self.protocol,
-                                   test_type, self.result)
+        return ','.join(str(value) for value in [
+            self.name, self.date, self.protocol, test_type, self.result
+        ] + self.latency)
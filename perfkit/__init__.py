@@ -1,21 +1,39 @@
 # This file is part of perfkit. See LICENSE file for license information.
 """Perfkit."""
 
+import atexit
+import copy
 import datetime
 import logging
 import os
 import subprocess
 import sys
+import time
 
 import pycloudlib
 
+from aws.images import daily_image
+
+from .pool import InstancePool
+from .scheduler import Scheduler
+from .settle import Settler
+from .stats import relative_width
+
+POOL = InstancePool()
+atexit.register(POOL.drain)
+
 
 class BaseTest:
     """Base test object."""
 
     test_name = 'unknown'
+    instance_policy = 'pristine'
+    serial_execute = False
 
-    def __init__(self, _, instance_type, release, iterations=1, log_dir=''):
+    def __init__(self, _, instance_type, release, iterations=1, log_dir='',
+                 parallel=1, prefetch=0, policy=None, pool_file=None,
+                 ci_width=None, max_iterations=None, time_budget=None,
+                 max_settle=120):
         """Initialize base test."""
         self.log_dir = os.path.join(
             log_dir, instance_type, release, self.test_name
@@ -27,12 +45,103 @@ class BaseTest:
         self.instance_type = instance_type
         self.release = release
         self.iterations = iterations
+        self.ci_width = ci_width
+        # never cap an adaptive run below the requested iterations
+        self.max_iterations = max(max_iterations or iterations, iterations)
+        self.time_budget = time_budget
+        self.stop_reason = ''
+        self.image_id = None
+        self.scheduler = Scheduler(
+            parallel, prefetch=prefetch, serial=self.serial_execute
+        )
+        self.pool = POOL
+        self.settler = Settler(max_wait=max_settle)
+        if policy:
+            self.instance_policy = policy
+        if pool_file:
+            self.pool.load(pool_file, self.cloud)
 
         self.csv_result = ''
         self.instance = None
+        self.iteration = None
+        self.results = []
+        self._samples = []
+        self._start = None
 
     def run(self):
-        """Execute a test."""
+        """Combine provision, execute, and cleanup and run iterations.
+
+        In adaptive mode, when a confidence interval width is given,
+        iterations continue past the requested number until the 95%
+        confidence interval of every primary metric is narrower than that
+        fraction of its mean, or the maximum iterations or time budget is
+        reached.
+        """
+        self.pin_image()
+        self._start = time.time()
+        self.stop_reason = ''
+
+        for result in self.scheduler.run(
+                self._run_iteration, self._planned(), stop=self._stop):
+            self.record(result)
+            self._samples.append(
+                self.primary_metrics(result) if self.ci_width else []
+            )
+
+        # keep the reason _stop gave for stopping, if any
+        if not self.stop_reason and self.ci_width:
+            self.stop_reason = 'reached maximum iterations'
+        elif not self.stop_reason:
+            self.stop_reason = 'completed %s iterations' % self._planned()
+        self.iterations = len(self._samples)
+
+        self._log.info('stopped: %s', self.stop_reason)
+        self.analyze()
+
+    def primary_metrics(self, result):
+        """Return the values of an iteration result adaptive runs watch.
+
+        By default the result is expected to be a sequence of numbers.
+        """
+        return list(result)
+
+    def stop_summary(self):
+        """Return CSV lines describing how many iterations ran and why."""
+        return '\n'.join([
+            '\nIterations,%s' % self.iterations,
+            'Stop reason,%s' % self.stop_reason,
+        ])
+
+    def _planned(self):
+        """Return the most iterations this run may execute."""
+        return self.max_iterations if self.ci_width else self.iterations
+
+    def _stop(self):
+        """Decide whether to stop starting new iterations."""
+        if self.time_budget and time.time() - self._start > self.time_budget:
+            self.stop_reason = 'time budget of %ss used' % self.time_budget
+            return True
+
+        if not self.ci_width or len(self._samples) < self.iterations:
+            return False
+
+        columns = list(zip(*self._samples))
+        widths = [relative_width(column) for column in columns]
+        if columns and max(widths) <= self.ci_width:
+            self.stop_reason = (
+                'confidence interval width %.1f%% below %.1f%%' %
+                (max(widths) * 100, self.ci_width * 100)
+            )
+            return True
+
+        return False
+
+    def record(self, result):
+        """Store the result of a single iteration."""
+        self.results.append(result)
+
+    def analyze(self):
+        """Analyze collected results and produce final output."""
         raise NotImplementedError
 
     def provision(self):
@@ -47,22 +156,93 @@ class BaseTest:
         """Parse test results."""
         raise NotImplementedError
 
-    def create_instance(self, **kwargs):
-        """Create an instance for testing."""
-        return self._launch_instance(**kwargs)
+    def _run_iteration(self, index):
+        """Run a single iteration on its own copy of the test.
 
-    def _launch_instance(self, **kwargs):
-        """Launch an instance."""
-        self._log.info('launching instance')
+        Each iteration gets a shallow copy so instance handles set during
+        provision do not collide with other iterations running at the same
+        time. Provisioning runs as soon as the scheduler allows, while
+        execute waits for an execute slot so prefetched iterations do not
+        disturb the one being measured. The value returned by execute is
+        handed back to record.
+        """
+        self._log.info(
+            'running iteration %s of %s', str(index+1), self._planned()
+        )
 
+        test = copy.copy(self)
+        test.iteration = index + 1
+        if self.scheduler.limit > 1:
+            test.cloud = pycloudlib.EC2(tag='perfkit')
+
+        test.provision()
         try:
-            image_id = self.cloud.daily_image(self.release)
-        except IndexError:
-            self._log.error('Could not find an image for %s', self.release)
-            sys.exit(1)
+            with self.scheduler.executing():
+                return test.execute()
+        finally:
+            test.cleanup()
+
+    def create_instance(self, wait=True, **kwargs):
+        """Create an instance for testing.
+
+        Instances come from the pool, which reuses an idle instance of the
+        same type, release, and image unless the test needs a pristine one.
+        Without wait a new instance is returned as soon as it is requested
+        and the caller waits for it to boot with instance.wait(). Reused
+        instances are in the availability zone and placement group asked
+        for, if any.
+        """
+        image_id = self.pin_image()
+        key = (self.instance_type, self.release, image_id)
+        placement = kwargs.get('Placement', {})
 
-        return self.cloud.launch(
-            image_id, instance_type=self.instance_type, **kwargs
+        return self.pool.acquire(
+            key, lambda: self._launch_instance(image_id, wait, **kwargs),
+            zone=placement.get('AvailabilityZone'),
+            group=placement.get('GroupName'),
+            reuse=self.instance_policy != 'pristine'
+        )
+
+    def release_instance(self, instance):
+        """Return an instance to the pool according to the test policy."""
+        self.pool.release(instance, self.instance_policy)
+
+    def install(self, *packages, instance=None):
+        """Install packages on the instance unless already present."""
+        self.pool.install(instance or self.instance, packages)
+
+    def settle(self, instance=None):
+        """Wait until the instance is quiet before the next measurement."""
+        return self.settler.quiet(instance or self.instance)
+
+    def pin_image(self):
+        """Find the daily image once and use it for the rest of the run.
+
+        Every iteration measures the same image even if a new daily image
+        is published part way through a run.
+        """
+        if not self.image_id:
+            try:
+                self.image_id = daily_image(self.release)
+            except IndexError:
+                self._log.error(
+                    'Could not find an image for %s', self.release
+                )
+                sys.exit(1)
+
+            self._log.info('using image %s', self.image_id)
+
+        return self.image_id
+
+    def _launch_instance(self, image_id, wait=True, **kwargs):
+        """Launch an instance."""
+        self._log.info('launching instance')
+
+        return self.scheduler.launch(
+            lambda: self.cloud.launch(
+                image_id, instance_type=self.instance_type, wait=wait,
+                **kwargs
+            )
         )
 
     @staticmethod
@@ -77,12 +257,18 @@ class BaseTest:
 
         return process.stdout.rsplit()[0].decode('utf-8')
 
-    def save_to_file(self, string, prefix='', suffix=''):
-        """Save the given string to a file in the log directory."""
+    def log_file(self, prefix='', suffix=''):
+        """Return the path of a new file in the log directory."""
         date = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
-        strings = [prefix, self.test_name, suffix, date]
+        iteration = str(self.iteration) if self.iteration else ''
+        strings = [prefix, self.test_name, suffix, iteration, date]
         filename = '%s.log' % '-'.join(filter(None, strings))
-        with open(os.path.join(self.log_dir, filename), 'w') as out:
+
+        return os.path.join(self.log_dir, filename)
+
+    def save_to_file(self, string, prefix='', suffix=''):
+        """Save the given string to a file in the log directory."""
+        with open(self.log_file(prefix, suffix), 'w') as out:
             out.write('%s\n' % string)
 
     def setup_logging(self):
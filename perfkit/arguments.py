@@ -0,0 +1,133 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Command line arguments shared by tests."""
+
+import argparse
+
+from .pool import POLICIES
+
+
+def add_iteration_args(parser, iterations):
+    """Add arguments shared by tests that run multiple iterations."""
+    parser.add_argument(
+        '--iterations', type=int, default=iterations,
+        help='number of test iterations to run'
+    )
+    parser.add_argument(
+        '--parallel', type=positive_int, default=1,
+        help='number of iterations to run at the same time'
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=0,
+        help='number of iterations to provision ahead in the background'
+    )
+    parser.add_argument(
+        '--ci-width', type=percent,
+        help='keep iterating until the 95%% confidence interval of each'
+        ' primary metric is narrower than this percent of its mean'
+    )
+    parser.add_argument(
+        '--max-iterations', type=positive_int, default=50,
+        help='most iterations to run with --ci-width, never fewer than'
+        ' --iterations'
+    )
+    parser.add_argument(
+        '--time-budget', type=int,
+        help='seconds after which no new iterations are started'
+    )
+
+
+def test_kwargs(args):
+    """Map parsed shared arguments to test keyword arguments."""
+    names = {
+        'parallel': 'parallel',
+        'prefetch': 'prefetch',
+        'instance_policy': 'policy',
+        'pool_file': 'pool_file',
+        'ci_width': 'ci_width',
+        'max_iterations': 'max_iterations',
+        'time_budget': 'time_budget',
+        'max_settle': 'max_settle',
+        'steadystate': 'steadystate',
+        'steadystate_duration': 'steadystate_duration',
+        'max_runtime': 'max_runtime',
+        'log_interval': 'log_interval',
+        'placement_group': 'placement_group',
+    }
+
+    return {
+        kwarg: getattr(args, name) for name, kwarg in names.items()
+        if hasattr(args, name)
+    }
+
+
+def add_settle_args(parser):
+    """Add arguments controlling waits for the instance to settle."""
+    parser.add_argument(
+        '--max-settle', type=int, default=120,
+        help='most seconds to wait for the instance to be quiet, 0 to not'
+        ' wait'
+    )
+
+
+def add_steadystate_args(parser):
+    """Add arguments ending fio workloads once they reach steady state."""
+    parser.add_argument(
+        '--steadystate',
+        help='fio steady state criterion, e.g. iops_slope:0.1%% or bw:5%%'
+    )
+    parser.add_argument(
+        '--steadystate-duration', type=int, default=60,
+        help='seconds the steady state criterion must hold'
+    )
+    parser.add_argument(
+        '--max-runtime', type=int, default=600,
+        help='most seconds to run each fio workload'
+    )
+    parser.add_argument(
+        '--log-interval', type=positive_int,
+        help='log IOPS and bandwidth averaged over this many milliseconds'
+        ' and split runs into burst and baseline phases'
+    )
+
+
+def add_pool_args(parser):
+    """Add arguments controlling reuse of pooled instances."""
+    parser.add_argument(
+        '--instance-policy', choices=POLICIES,
+        help='pristine, clean, or warm instance; default depends on test'
+    )
+    parser.add_argument(
+        '--pool', dest='pool_file',
+        help='file to keep idle instances in for reuse by later runs'
+    )
+
+
+def add_placement_args(parser):
+    """Add arguments controlling where instances of a pair are placed."""
+    parser.add_argument(
+        '--placement-group',
+        help='existing cluster placement group to launch instances into'
+    )
+
+
+def comma_list(convert):
+    """Argparse type for a comma separated list of values."""
+    return lambda value: [convert(item) for item in value.split(',')]
+
+
+def percent(value):
+    """Argparse type for a percentage returned as a fraction."""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError('must be greater than 0')
+
+    return number / 100
+
+
+def positive_int(value):
+    """Argparse type for integers greater than zero."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1')
+
+    return number
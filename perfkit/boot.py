@@ -13,10 +13,11 @@ The end result will be the results and averages.
 """
 
 import argparse
-import statistics
 import sys
 
 from . import BaseTest
+from .arguments import add_iteration_args, test_kwargs
+from .results import ResultTable
 
 
 class BootResult:
@@ -38,29 +39,23 @@ class BootResult:
         return "%.3f,%.3f,%.3f" % (self.kernel, self.userspace, self.total)
 
 
+BOOT_COLUMNS = ['kernel', 'userspace', 'total']
+
+
 class BootTest(BaseTest):
     """Boot Time Test Object."""
 
     test_name = 'boot'
 
-    def __init__(self, cloud, instance_type, release, iterations, log_dir):
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 **kwargs):
         """Initialize Boot Time Test."""
-        super().__init__(cloud, instance_type, release, iterations, log_dir)
-
-        self.systemd_launch_times = []
-        self.systemd_reboot_times = []
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
 
-    def run(self):
-        """Combine provision, execute, and cleanup and run iterations."""
-        for index in range(self.iterations):
-            self._log.info(
-                'running iteration %s of %s', str(index+1), self.iterations
-            )
-            self.provision()
-            self.execute()
-            self.cleanup()
-
-        self.analyze()
+        self.systemd_launch_times = ResultTable(BOOT_COLUMNS)
+        self.systemd_reboot_times = ResultTable(BOOT_COLUMNS)
 
     def provision(self):
         """Create and setup instances for testing."""
@@ -68,14 +63,26 @@ class BootTest(BaseTest):
 
     def execute(self):
         """Run the test."""
-        self._systemd_output()
+        launch_times = self._systemd_output()
         self._log.info('restarting instance')
         self.instance.restart()
-        self._systemd_output(reboot=True)
+        reboot_times = self._systemd_output(reboot=True)
+
+        return launch_times, reboot_times
 
     def cleanup(self):
         """Tear down instances."""
-        self.instance.delete()
+        self.release_instance(self.instance)
+
+    def record(self, result):
+        """Store initial boot and reboot times of an iteration."""
+        launch_times, reboot_times = result
+        self.systemd_launch_times.append_attributes(launch_times)
+        self.systemd_reboot_times.append_attributes(reboot_times)
+
+    def primary_metrics(self, result):
+        """Watch total initial boot and reboot time."""
+        return [times.total for times in result]
 
     def analyze(self):
         """Analyze collected results and produce final output."""
@@ -86,6 +93,7 @@ class BootTest(BaseTest):
             self._print_results(self.systemd_launch_times),
             '\nReboot',
             self._print_results(self.systemd_reboot_times),
+            self.stop_summary(),
         ])
 
         self.save_to_file(self.csv_result, prefix='results')
@@ -95,11 +103,7 @@ class BootTest(BaseTest):
         result = self.instance.execute('systemd-analyze')
         self.save_to_file(result, suffix='reboot' if reboot else '')
 
-        times = self._parse_systemd_analyze(result)
-        if reboot:
-            self.systemd_reboot_times.append(times)
-        else:
-            self.systemd_launch_times.append(times)
+        return self._parse_systemd_analyze(result)
 
     @staticmethod
     def _parse_systemd_analyze(result):
@@ -122,48 +126,17 @@ class BootTest(BaseTest):
 
         return result
 
-    def _print_results(self, boot_time_result):
-        """Format results with average, median, and std. deviation."""
+    @staticmethod
+    def _print_results(boot_times):
+        """Format results with summary statistics."""
         result = ['iteration,kernel,userspace,total']
-        for count, boot_time in enumerate(boot_time_result):
-            result.append('%s,%s' % (count, boot_time))
+        for count, row in enumerate(boot_times.rows()):
+            result.append('%s,%.3f,%.3f,%.3f' % ((count,) + row))
 
-        result.append(self._calc_average(boot_time_result))
-        result.append(self._calc_median(boot_time_result))
-        if self.iterations > 1:
-            result.append(self._calc_stdev(boot_time_result))
+        result.extend(boot_times.summary_csv())
 
         return '\n'.join(result)
 
-    @staticmethod
-    def _calc_average(results):
-        """Return averages of results."""
-        total = len(results)
-
-        kernel = sum([result.kernel for result in results]) / total
-        userspace = sum([result.userspace for result in results]) / total
-        total = sum([result.total for result in results]) / total
-
-        return '\naverage,%.3f,%.3f,%.3f' % (kernel, userspace, total)
-
-    @staticmethod
-    def _calc_median(results):
-        """Return averages of results."""
-        kernel = statistics.median([result.kernel for result in results])
-        userspace = statistics.median([result.userspace for result in results])
-        total = statistics.median([result.total for result in results])
-
-        return 'median,%.3f,%.3f,%.3f' % (kernel, userspace, total)
-
-    @staticmethod
-    def _calc_stdev(results):
-        """Return averages of results."""
-        kernel = statistics.stdev([result.kernel for result in results])
-        userspace = statistics.stdev([result.userspace for result in results])
-        total = statistics.stdev([result.total for result in results])
-
-        return 'std dev,%.3f,%.3f,%.3f' % (kernel, userspace, total)
-
 
 def _setup_args():
     """TODO."""
@@ -181,10 +154,7 @@ def _setup_args():
         '--release', required=True,
         help='Ubuntu release to test; default is latest LTS'
     )
-    parser.add_argument(
-        '--iterations', type=int, default=10,
-        help='number of test iterations to run'
-    )
+    add_iteration_args(parser, iterations=10)
 
     return parser.parse_args()
 
@@ -195,7 +165,8 @@ def run_boot_testing():
 
     test = BootTest(
         'ec2', args.instance_type, args.release,
-        args.iterations, args.log_dir
+        args.iterations, args.log_dir,
+        **test_kwargs(args)
     )
 
     test.run()
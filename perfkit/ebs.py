@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""EBS volume type performance against provisioned values.
+
+Several volumes, for example gp2, gp3 with provisioned IOPS and
+throughput, and io1/io2, are attached to a single instance and each is
+tested with an IOPS and a throughput fio profile, either one volume
+after another or all at once.
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+
+from aws.volumes import (
+    attach_volumes, create_volumes, parse_volume_spec, provisioned,
+    remove_volumes, volume_label
+)
+
+from .arguments import (
+    add_iteration_args, add_pool_args, add_settle_args,
+    add_steadystate_args, test_kwargs
+)
+from .fio import FioTest
+from .profiles import device_target
+from .results import ResultTable
+
+EBS_COLUMNS = [
+    'iops', 'provisioned_iops', 'iops_ratio', 'throughput',
+    'provisioned_throughput', 'throughput_ratio', 'p99'
+]
+
+
+class EbsTest(FioTest):
+    """EBS Test Object."""
+
+    test_name = 'ebs'
+
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 volumes=(), concurrent=False, iops_profile='randread',
+                 throughput_profile='read-1m', numjobs=4, **kwargs):
+        """Initialize EBS Test."""
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
+
+        self.volumes = list(volumes)
+        self.concurrent = concurrent
+        self.iops_profile = iops_profile
+        self.throughput_profile = throughput_profile
+        self.numjobs = numjobs
+        self.volume_ids = []
+        self.devices = []
+        self.volume_results = collections.OrderedDict(
+            (volume_label(spec), ResultTable(EBS_COLUMNS))
+            for spec in self.volumes
+        )
+
+    def provision(self):
+        """Create an instance and attach every volume to it."""
+        self.instance = self.create_instance()
+        self.install('fio')
+
+        self._log.info('creating %s volumes', len(self.volumes))
+        try:
+            self.volume_ids = create_volumes(
+                self.volumes, self.instance.availability_zone
+            )
+            attached = attach_volumes(self.instance.id, self.volume_ids)
+
+            def devices_found():
+                """Find the block devices of all volumes."""
+                self.devices = self._find_devices(attached)
+                return all(self.devices)
+
+            self.settler.wait_for(
+                devices_found, 'EBS volumes to appear', max_wait=300
+            )
+        except Exception:
+            remove_volumes(self.volume_ids)
+            self.volume_ids = []
+            raise
+
+        if not all(self.devices):
+            self._log.error('volumes not found on instance')
+            remove_volumes(self.volume_ids)
+            self.release_instance(self.instance)
+            sys.exit(1)
+
+    def execute(self):
+        """Run the profiles on every volume, return rows by volume."""
+        profiles = [self.iops_profile, self.throughput_profile]
+        results = collections.OrderedDict()
+
+        if self.concurrent:
+            job = self.profiles.render_devices(
+                profiles, self.devices,
+                device_target(self.devices[0], numjobs=self.numjobs),
+                **self.job_options
+            )
+            data = self._run_job_file(job, suffix='volumes')
+            for spec, device in zip(self.volumes, self.devices):
+                results[volume_label(spec)] = self._volume_row(
+                    spec, data, ['%s-%s' % (profile, os.path.basename(device))
+                                 for profile in profiles]
+                )
+            return results
+
+        for index, (spec, device) in enumerate(
+                zip(self.volumes, self.devices)):
+            if index:
+                self.settle()
+            self._log.info('testing %s volume', volume_label(spec))
+            job = self.profiles.render(
+                profiles, device_target(device, numjobs=self.numjobs),
+                **self.job_options
+            )
+            data = self._run_job_file(job, suffix=volume_label(spec))
+            results[volume_label(spec)] = self._volume_row(
+                spec, data, profiles
+            )
+
+        return results
+
+    def cleanup(self):
+        """Detach and delete the volumes and release the instance."""
+        if self.volume_ids:
+            self._log.info('removing %s volumes', len(self.volume_ids))
+            remove_volumes(self.volume_ids)
+
+        super().cleanup()
+
+    def record(self, result):
+        """Store the results of every volume."""
+        for label, row in result.items():
+            self.volume_results[label].append(row)
+
+    def primary_metrics(self, result):
+        """Watch achieved IOPS and throughput of every volume."""
+        metrics = []
+        for row in result.values():
+            metrics.extend([row[0], row[3]])
+
+        return metrics
+
+    def analyze(self):
+        """Analyze collected results and produce final output."""
+        result = [
+            'EBS volume performance against provisioned values',
+            'Command,fio',
+            'IOPS profile,%s' % self.iops_profile,
+            'Throughput profile,%s' % self.throughput_profile,
+            'Volumes tested,%s' % (
+                'concurrently' if self.concurrent else 'one at a time'
+            ),
+            '\nvolume,iops,provisioned iops,iops %,MiB/s,'
+            'provisioned MiB/s,MiB/s %,clat p99 (us)',
+        ]
+
+        # median of every metric over all iterations
+        for label, table in self.volume_results.items():
+            if len(table) == 0:
+                continue
+            summary = table.summary()
+            result.append('%s,%.f,%.f,%.1f,%.1f,%.f,%.1f,%.1f' % (
+                label, *[summary[name].median for name in EBS_COLUMNS]
+            ))
+
+        result.append(self.stop_summary())
+
+        self.csv_result = '\n'.join(result)
+        self.save_to_file(self.csv_result, prefix='results')
+
+    def _volume_row(self, spec, data, jobs):
+        """Return achieved and provisioned values of a volume.
+
+        Ratios are achieved as a percent of provisioned and NaN where the
+        volume type has nothing provisioned.
+        """
+        iops_job, throughput_job = jobs
+        iops = self._fio_result(
+            data, self._direction(self.iops_profile), job=iops_job
+        )
+        throughput = self._fio_result(
+            data, self._direction(self.throughput_profile),
+            job=throughput_job
+        )
+
+        # fio reports bandwidth in KiB/s
+        mebibytes = throughput.bw / 1024
+        provisioned_iops, provisioned_throughput = [
+            float('nan') if value is None else value
+            for value in provisioned(spec)
+        ]
+
+        return [
+            iops.iops, provisioned_iops,
+            100 * iops.iops / provisioned_iops,
+            mebibytes, provisioned_throughput,
+            100 * mebibytes / provisioned_throughput,
+            iops.p99,
+        ]
+
+    def _direction(self, profile):
+        """Return the direction fio reports a library profile in."""
+        readwrite = self.profiles.parser.get(profile, 'readwrite')
+
+        return 'write' if 'write' in readwrite else 'read'
+
+    def _find_devices(self, attached):
+        """Return the block device of each volume, None if not found yet.
+
+        On Nitro instances volumes are NVMe devices with the volume id as
+        serial number, on Xen they appear as /dev/xvd* devices.
+        """
+        output = self.instance.execute(
+            'lsblk --json --nodeps --output NAME,SERIAL'
+        )
+        devices = json.loads(output)['blockdevices']
+        serials = {
+            (device.get('serial') or '').strip(): device['name']
+            for device in devices
+        }
+        names = [device['name'] for device in devices]
+
+        found = []
+        for volume_id in self.volume_ids:
+            xen = attached[volume_id].replace('/dev/sd', 'xvd')
+            if volume_id.replace('-', '') in serials:
+                found.append('/dev/%s' % serials[volume_id.replace('-', '')])
+            elif xen in names:
+                found.append('/dev/%s' % xen)
+            else:
+                found.append(None)
+
+        return found
+
+
+def _setup_args():
+    """TODO."""
+    parser = argparse.ArgumentParser(
+        prog='ebs',
+        description='EBS volume performance against provisioned values'
+    )
+
+    parser.add_argument(
+        '--log-dir', default='logs', help='dir to write logs'
+    )
+    parser.add_argument(
+        'instance_type', help='Instance type to test'
+    )
+    parser.add_argument(
+        '--release', required=True,
+        help='Ubuntu release to test; default is latest LTS'
+    )
+    parser.add_argument(
+        '--volume', dest='volumes', action='append', type=parse_volume_spec,
+        help='volume as TYPE:SIZE[:IOPS[:THROUGHPUT]], e.g. gp3:100:6000:500;'
+        ' may be repeated'
+    )
+    parser.add_argument(
+        '--concurrent', action='store_true',
+        help='test all volumes at the same time instead of in turn'
+    )
+    parser.add_argument(
+        '--iops-profile', default='randread',
+        help='fio profile measuring IOPS'
+    )
+    parser.add_argument(
+        '--throughput-profile', default='read-1m',
+        help='fio profile measuring throughput'
+    )
+    add_iteration_args(parser, iterations=1)
+    add_pool_args(parser)
+    add_settle_args(parser)
+    add_steadystate_args(parser)
+
+    args = parser.parse_args()
+    if not args.volumes:
+        args.volumes = [
+            parse_volume_spec(spec) for spec in
+            ['gp2:100', 'gp3:100', 'gp3:100:6000:500', 'io2:100:5000']
+        ]
+
+    return args
+
+
+def run_ebs_testing():
+    """TODO."""
+    args = _setup_args()
+
+    test = EbsTest(
+        'ec2', args.instance_type, args.release,
+        args.iterations, args.log_dir,
+        volumes=args.volumes, concurrent=args.concurrent,
+        iops_profile=args.iops_profile,
+        throughput_profile=args.throughput_profile,
+        **test_kwargs(args)
+    )
+
+    test.run()
+    print(test.csv_result)
+
+
+if __name__ == '__main__':
+    sys.exit(run_ebs_testing())
@@ -1,11 +1,49 @@
 #!/usr/bin/env python3
-"""FIO NVMe Testing."""
+"""FIO NVMe Testing.
+
+By default all free NVMe devices are tested together as a RAID 0 array.
+The devices mode runs fio on every device at the same time, each in its
+own job group, to report each device, their aggregate, and how evenly
+they perform. The compare mode does both to show whether md or a single
+slow device limits the array. The filesystems mode formats the array
+with each filesystem and mount option set in turn and compares them
+with the raw array.
+"""
 
 import argparse
+import collections
 import json
+import os
 import sys
 
-from .fio import FioTest
+from parse.histogram import LatencyHistogram
+
+from .arguments import (
+    add_iteration_args, add_pool_args, add_settle_args,
+    add_steadystate_args, test_kwargs
+)
+from .fio import FIO_COLUMNS, FioTest
+from .profiles import device_target
+from .results import ResultTable
+from .stats import jain_fairness, summarize
+
+MODES = ['raid', 'devices', 'compare', 'filesystems']
+DIRECTIONS = ['read', 'write']
+AGGREGATE_COLUMNS = ['iops', 'bw', 'p99', 'fairness', 'balance']
+
+# filesystems as TYPE[:OPTIONS] with options passed to mount -o
+FILESYSTEMS = ['ext4', 'ext4:noatime', 'xfs', 'xfs:noatime,discard']
+MKFS = {'ext4': 'mkfs.ext4 -F -q', 'xfs': 'mkfs.xfs -f -q'}
+MOUNT_POINT = '/mnt/fio'
+
+# size of the test file on a filesystem, shared by all jobs
+FILE_SIZE = '10G'
+
+# total jobs across devices, matching the jobs used on the array
+TOTAL_JOBS = 32
+
+# below this min/max device IOPS ratio the devices are unbalanced
+BALANCED = 0.9
 
 
 class FioNvmeTest(FioTest):
@@ -13,32 +51,395 @@ class FioNvmeTest(FioTest):
 
     test_name = 'fio-nvme'
 
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 mode='raid', filesystems=None, file_size=FILE_SIZE,
+                 **kwargs):
+        """Initialize FIO NVMe Test."""
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
+
+        self.mode = mode
+        self.filesystems = list(filesystems or FILESYSTEMS)
+        self.file_size = file_size
+        self.mounted = False
+        self.nvme_disks = []
+        self.device_results = collections.OrderedDict()
+        self.aggregate_results = collections.OrderedDict(
+            (direction, ResultTable(AGGREGATE_COLUMNS))
+            for direction in DIRECTIONS
+        )
+        self.filesystem_results = collections.OrderedDict(
+            (filesystem, {
+                direction: ResultTable(FIO_COLUMNS, types={'io': 'q'})
+                for direction in DIRECTIONS
+            })
+            for filesystem in self.filesystems
+        )
+        self.mount_failures = collections.Counter()
+
     def provision(self):
         """Create and setup instances for testing."""
         self.instance = self.create_instance()
-        self.instance.execute('sudo apt-get update')
-        self.instance.execute('sudo apt-get install --yes fio')
-        self.instance.execute('sudo apt-get install --yes mdadm')
-        self.raid_disk = self._create_raid_0()
+        packages = ['fio', 'mdadm']
+        fstypes = [parse_filesystem(text)[0] for text in self.filesystems]
+        if self.mode == 'filesystems' and 'xfs' in fstypes:
+            packages.append('xfsprogs')
+        self.install(*packages)
+        self.nvme_disks = self._find_free_nvme_disks()
 
-    def _create_raid_0(self):
-        """Create RAID 0 with given disks."""
-        disks = self._find_free_nvme_disks()
-
-        if not disks:
+        if not self.nvme_disks:
             self.instance.delete()
             self._log.error('No disks to test')
             sys.exit(1)
-        elif len(disks) == 1:
+
+        if self.mode in ('raid', 'filesystems'):
+            self.raid_disk = self._create_raid_0()
+
+    def execute(self):
+        """Run the test on each device, the array, or filesystems.
+
+        Returns results of the devices, the array, and the filesystems,
+        None for those the mode does not test.
+        """
+        if self.mode == 'raid':
+            return None, super().execute(), None
+        if self.mode == 'filesystems':
+            raw = super().execute()
+            return None, raw, self._run_filesystems()
+
+        devices = self._run_devices()
+        raid = None
+        if self.mode == 'compare':
+            self.settle()
+            self.raid_disk = self._create_raid_0()
+            raid = super().execute()
+
+        return devices, raid, None
+
+    def record(self, result):
+        """Store per-device, aggregate, array, and filesystem results."""
+        devices, raid, filesystems = result
+        if raid:
+            super().record(raid)
+
+        for filesystem, results in (filesystems or {}).items():
+            if results is None:
+                self.mount_failures[filesystem] += 1
+                continue
+            for direction, data in zip(DIRECTIONS, results):
+                self.filesystem_results[filesystem][direction] \
+                    .append_attributes(data)
+
+        for direction, results in (devices or {}).items():
+            for device, data in results:
+                key = (direction, device)
+                if key not in self.device_results:
+                    self.device_results[key] = ResultTable(
+                        FIO_COLUMNS, types={'io': 'q'}
+                    )
+                self.device_results[key].append_attributes(data)
+
+            self.aggregate_results[direction].append(
+                self._aggregate([data for _, data in results])
+            )
+
+    def primary_metrics(self, result):
+        """Watch aggregate device, array, and filesystem IOPS."""
+        devices, raid, filesystems = result
+        metrics = []
+        for results in (devices or {}).values():
+            metrics.append(sum(data.iops for _, data in results))
+        if raid:
+            metrics.extend(super().primary_metrics(raid))
+        for results in (filesystems or {}).values():
+            if results:
+                metrics.extend(super().primary_metrics(results))
+
+        return metrics
+
+    def analyze(self):
+        """Analyze collected results and produce final output."""
+        if self.mode == 'raid':
+            super().analyze()
+            return
+        if self.mode == 'filesystems':
+            self._analyze_filesystems()
+            return
+
+        result = [
+            'Concurrent 4K IOPS performance of each NVMe device',
+            'Command,fio',
+        ]
+        for direction in DIRECTIONS:
+            result.append(self._print_devices(direction))
+
+        if self.mode == 'compare':
+            result.extend([
+                '\nRAID 0 Read',
+                self._print_results(self.read_results),
+                '\nRAID 0 Write',
+                self._print_results(self.write_results),
+                self._print_comparison(),
+            ])
+
+        result.append(self.stop_summary())
+
+        self.csv_result = '\n'.join(result)
+        self.save_to_file(self.csv_result, prefix='results')
+
+    def cleanup(self):
+        """Stop the RAID array and tear down instances."""
+        self._unmount()
+        if self.raid_disk == '/dev/md0':
+            self.instance.execute('sudo mdadm --stop /dev/md0')
+            self.instance.execute(
+                'sudo mdadm --zero-superblock %s' % ' '.join(self.nvme_disks)
+            )
+
+        super().cleanup()
+
+    def _analyze_filesystems(self):
+        """Compare each filesystem with the raw array.
+
+        Ratios are the filesystem median over the raw median and the
+        latency overhead the difference of median p99 latencies.
+        """
+        result = [
+            'Filesystem and mount option 4K IOPS performance against the'
+            ' raw device',
+            'Command,fio',
+            'File size,%s' % self.file_size,
+            '\nRaw Read',
+            self._print_results(self.read_results),
+            '\nRaw Write',
+            self._print_results(self.write_results),
+            '\nFilesystem comparison',
+            'filesystem,mount options,direction,iops,iops/raw,bw,bw/raw,'
+            'clat p99 (us),p99 overhead (us)',
+        ]
+        raw = {
+            'read': self.read_results.summary(),
+            'write': self.write_results.summary(),
+        }
+        for filesystem, tables in self.filesystem_results.items():
+            fstype, options = parse_filesystem(filesystem)
+            if len(tables['read']) == 0:
+                result.append('%s,"%s",mount failed' % (fstype, options))
+                continue
+
+            for direction in DIRECTIONS:
+                summary = tables[direction].summary()
+                baseline = raw[direction]
+                result.append('%s,"%s",%s,%.f,%.3f,%.f,%.3f,%.1f,%.1f' % (
+                    fstype, options, direction, summary['iops'].median,
+                    _ratio(summary['iops'].median, baseline['iops'].median),
+                    summary['bw'].median,
+                    _ratio(summary['bw'].median, baseline['bw'].median),
+                    summary['p99'].median,
+                    summary['p99'].median - baseline['p99'].median
+                ))
+
+        failures = sum(self.mount_failures.values())
+        if failures:
+            result.append('\nmount failures,%s' % ','.join(
+                '%s x%s' % item for item in self.mount_failures.items()
+            ))
+        result.append(self.stop_summary())
+
+        self.csv_result = '\n'.join(result)
+        self.save_to_file(self.csv_result, prefix='results')
+
+    def _run_filesystems(self):
+        """Run fio on each filesystem, return results by filesystem.
+
+        Every filesystem is created fresh on the array. A set of mount
+        options the kernel rejects, such as nobarrier on recent xfs, gives
+        None instead of results.
+        """
+        results = collections.OrderedDict()
+        for filesystem in self.filesystems:
+            self.settle()
+            self._log.info('testing %s', filesystem)
+            if not self._mount(*parse_filesystem(filesystem)):
+                results[filesystem] = None
+                continue
+
+            results[filesystem] = super().execute()
+            self._unmount()
+
+        return results
+
+    def _mount(self, fstype, options):
+        """Format the array and mount it, return if it is mounted."""
+        self.instance.execute(
+            'sudo %s %s' % (MKFS[fstype], self.raid_disk)
+        )
+        self.instance.execute('sudo mkdir -p %s' % MOUNT_POINT)
+        self.instance.execute('sudo mount -t %s -o %s %s %s' % (
+            fstype, options, self.raid_disk, MOUNT_POINT
+        ))
+
+        mounted = self.instance.execute(
+            'findmnt -n -o FSTYPE,OPTIONS %s' % MOUNT_POINT
+        ).strip()
+        if not mounted.startswith(fstype):
+            self._log.error(
+                'could not mount %s with %s options', fstype, options
+            )
+            return False
+
+        self._log.info('mounted %s', mounted)
+        self.mounted = True
+        return True
+
+    def _unmount(self):
+        """Unmount the filesystem under test if there is one."""
+        if self.mounted:
+            self.instance.execute('sudo umount %s' % MOUNT_POINT)
+            self.mounted = False
+
+    def _target(self):
+        """Return a file on the mounted filesystem or the raw array."""
+        target = super()._target()
+        if self.mounted:
+            target.update({
+                'FIO_FILENAME': '%s/fio.test' % MOUNT_POINT,
+                'FIO_SIZE': self.file_size,
+            })
+
+        return target
+
+    def _create_raid_0(self):
+        """Create RAID 0 with given disks."""
+        disks = self.nvme_disks
+
+        if len(disks) == 1:
             return '%s' % disks[0]
+
+        mdadm_cmd = (
+            'sudo mdadm --create /dev/md0 --level=0 --name=TEST_RAID'
+            ' --raid-devices=%s %s' % (len(disks), ' '.join(disks))
+        )
+
+        self.instance.execute(mdadm_cmd)
+        return '/dev/md0'
+
+    def _run_devices(self):
+        """Run fio on all devices at once and return results by direction.
+
+        The jobs are split between devices so the total matches the run
+        on the array.
+        """
+        numjobs = max(1, TOTAL_JOBS // len(self.nvme_disks))
+        job = self.profiles.render_devices(
+            DIRECTIONS, self.nvme_disks,
+            device_target(self.nvme_disks[0], numjobs=numjobs),
+            **self.job_options
+        )
+        data = self._run_job_file(job, suffix='devices')
+
+        results = collections.OrderedDict()
+        for direction in DIRECTIONS:
+            results[direction] = [
+                (device, self._fio_result(data, direction, job='%s-%s' % (
+                    direction, os.path.basename(device)
+                )))
+                for device in self.nvme_disks
+            ]
+
+        return results
+
+    @staticmethod
+    def _aggregate(results):
+        """Return aggregate row of concurrent per-device results.
+
+        Latency comes from the merged histograms of all devices. Fairness
+        is Jain's index of device IOPS and balance the ratio of slowest
+        to fastest device.
+        """
+        iops = [data.iops for data in results]
+        histogram = LatencyHistogram()
+        for data in results:
+            histogram.merge(data.histogram)
+
+        if histogram.bins:
+            p99 = histogram.percentile(99) / 1000
         else:
-            mdadm_cmd = (
-                'sudo mdadm --create /dev/md0 --level=0 --name=TEST_RAID'
-                ' --raid-devices=%s %s' % (len(disks), ' '.join(disks))
-            )
+            p99 = max(data.p99 for data in results)
+
+        return [
+            sum(iops), sum(data.bw for data in results), p99,
+            jain_fairness(iops), min(iops) / max(iops) if max(iops) else 1.0
+        ]
+
+    def _print_devices(self, direction):
+        """Format per-device medians and aggregate results of a direction."""
+        result = [
+            '\n%s per device' % direction.capitalize(),
+            'device,iops,bw,clat p50 (us),clat p99 (us)',
+        ]
+        for (row_direction, device), table in self.device_results.items():
+            if row_direction != direction:
+                continue
+            summary = table.summary()
+            result.append('%s,%.f,%.f,%.1f,%.1f' % (
+                os.path.basename(device), summary['iops'].median,
+                summary['bw'].median, summary['p50'].median,
+                summary['p99'].median
+            ))
+
+        table = self.aggregate_results[direction]
+        result.append('\n%s all devices' % direction.capitalize())
+        result.append('iteration,iops,bw,clat p99 (us),fairness,min/max')
+        for count, row in enumerate(table.rows()):
+            result.append('%s,%.f,%.f,%.1f,%.3f,%.3f' % ((count+1,) + row))
+        result.extend(table.summary_csv())
+
+        return '\n'.join(result)
+
+    def _print_comparison(self):
+        """Compare the array with the devices run on their own.
+
+        If the devices are balanced but the array falls short of their
+        aggregate, md is the limit. If the array only reaches the slowest
+        device times the device count, that device is the limit.
+        """
+        result = [
+            '\nRAID 0 comparison',
+            'direction,devices iops,md iops,md/devices,'
+            'slowest x devices,md/(slowest x devices),limit',
+        ]
+        arrays = {'read': self.read_results, 'write': self.write_results}
+        for direction in DIRECTIONS:
+            if (len(arrays[direction]) == 0 or
+                    len(self.aggregate_results[direction]) == 0):
+                continue
+
+            aggregate = self.aggregate_results[direction].summary()
+            devices = aggregate['iops'].median
+            balance = aggregate['balance'].median
+            array = summarize(arrays[direction].column('iops')).median
+            device_iops = [
+                summarize(table.column('iops')).median
+                for (row_direction, _), table in self.device_results.items()
+                if row_direction == direction
+            ]
+            slowest = min(device_iops) * len(device_iops)
+
+            if array >= BALANCED * devices:
+                limit = 'none'
+            elif balance < BALANCED and array <= slowest / BALANCED:
+                limit = 'slowest device'
+            else:
+                limit = 'md overhead'
+
+            result.append('%s,%.f,%.f,%.3f,%.f,%.3f,%s' % (
+                direction, devices, array, array / devices if devices else 0,
+                slowest, array / slowest if slowest else 0, limit
+            ))
 
-            self.instance.execute(mdadm_cmd)
-            return '/dev/md0'
+        return '\n'.join(result)
 
     def _find_free_nvme_disks(self):
         """Find available and free nvme disks."""
@@ -54,6 +455,20 @@ class FioNvmeTest(FioTest):
         return devices
 
 
+def parse_filesystem(text):
+    """Split TYPE[:OPTIONS] such as xfs:noatime,discard into its parts."""
+    fstype, _, options = text.partition(':')
+    if fstype not in MKFS:
+        raise ValueError('unsupported filesystem: %s' % fstype)
+
+    return fstype, options or 'defaults'
+
+
+def _ratio(value, baseline):
+    """Return value over baseline, NaN without a baseline."""
+    return value / baseline if baseline else float('nan')
+
+
 def _setup_args():
     """TODO."""
     parser = argparse.ArgumentParser(
@@ -71,11 +486,33 @@ def _setup_args():
         help='Ubuntu release to test; default is latest LTS'
     )
     parser.add_argument(
-        '--iterations', type=int, default=5,
-        help='number of test iterations to run'
+        '--mode', choices=MODES, default='raid',
+        help='test the RAID 0 array, each device at once, compare both,'
+        ' or compare filesystems on the array with the raw array'
     )
+    parser.add_argument(
+        '--filesystem', dest='filesystems', action='append',
+        help='filesystem as TYPE[:OPTIONS] for the filesystems mode, e.g.'
+        ' xfs:noatime,discard; may be repeated, default %s' %
+        ' '.join(FILESYSTEMS)
+    )
+    parser.add_argument(
+        '--file-size', default=FILE_SIZE,
+        help='size of the test file on each filesystem'
+    )
+    add_iteration_args(parser, iterations=5)
+    add_pool_args(parser)
+    add_settle_args(parser)
+    add_steadystate_args(parser)
+
+    args = parser.parse_args()
+    for filesystem in args.filesystems or []:
+        try:
+            parse_filesystem(filesystem)
+        except ValueError as error:
+            parser.error(str(error))
 
-    return parser.parse_args()
+    return args
 
 
 def run_boot_testing():
@@ -84,7 +521,9 @@ def run_boot_testing():
 
     test = FioNvmeTest(
         'ec2', args.instance_type, args.release,
-        args.iterations, args.log_dir
+        args.iterations, args.log_dir, mode=args.mode,
+        filesystems=args.filesystems, file_size=args.file_size,
+        **test_kwargs(args)
     )
 
     test.run()
@@ -2,12 +2,20 @@
 """FIO Testing."""
 
 import argparse
-import json
-import statistics
+import math
 import sys
-import time
+
+from parse.histogram import LatencyHistogram
+from parse.log.fio import PERCENTILES, completion_latency, load_fio_json
 
 from . import BaseTest
+from .arguments import (
+    add_iteration_args, add_pool_args, add_settle_args,
+    add_steadystate_args, test_kwargs
+)
+from .profiles import FioProfiles, device_target
+from .results import ResultTable
+from .timeseries import TimeSeries, split_fio_logs
 
 
 class FioResult:
@@ -19,6 +27,18 @@ class FioResult:
         self.bw = 0.0
         self.io = 0.0
         self.util = 0.0
+        self.p50 = 0.0
+        self.p99 = 0.0
+        self.p999 = 0.0
+        self.p9999 = 0.0
+        self.runtime = 0.0
+        self.steady = float('nan')
+        self.burst_iops = float('nan')
+        self.baseline_iops = float('nan')
+        self.burst_bw = float('nan')
+        self.baseline_bw = float('nan')
+        self.throttle = float('nan')
+        self.histogram = LatencyHistogram()
 
     def __str__(self):
         """Print CSV of results."""
@@ -27,60 +47,109 @@ class FioResult:
         )
 
 
+# column name, CSV header, and format of every per-iteration fio value
+FIO_FIELDS = [
+    ('iops', 'iops', '%.f'),
+    ('bw', 'bw', '%.f'),
+    ('io', 'io', '%.f'),
+    ('util', 'mean disk util', '%.2f'),
+    ('p50', 'clat p50 (us)', '%.1f'),
+    ('p99', 'clat p99 (us)', '%.1f'),
+    ('p999', 'clat p99.9 (us)', '%.1f'),
+    ('p9999', 'clat p99.99 (us)', '%.1f'),
+    ('runtime', 'runtime (s)', '%.f'),
+    ('steady', 'steady state', '%.f'),
+    ('burst_iops', 'burst iops', '%.f'),
+    ('baseline_iops', 'baseline iops', '%.f'),
+    ('burst_bw', 'burst bw', '%.f'),
+    ('baseline_bw', 'baseline bw', '%.f'),
+    ('throttle', 'time to throttle (s)', '%.f'),
+]
+FIO_COLUMNS = [name for name, _, _ in FIO_FIELDS]
+STEADY_COLUMNS = ['steady']
+PHASE_COLUMNS = [
+    'burst_iops', 'baseline_iops', 'burst_bw', 'baseline_bw', 'throttle'
+]
+
+
 class FioTest(BaseTest):
     """FIO Test Object."""
 
     test_name = 'fio'
-
-    def __init__(self, cloud, instance_type, release, iterations, log_dir):
-        """Initialize FIO Test."""
-        super().__init__(cloud, instance_type, release, iterations, log_dir)
-
-        self.read_results = []
-        self.write_results = []
-        self.raid_disk = None
-
-        self.fio_boot_disk = (
-            "fio --name={name} --readwrite={type} --size=1G --numjobs=4"
-            " --direct=1 --ioengine=libaio --iodepth=32"
-            " --time_based --ramp_time=60 --runtime=600"
-            " --group_reporting=1 --output-format=json --output=fio.json"
-        )
-        self.fio_raid_disk = (
-            "sudo fio --name={name} --readwrite={type} --filename={disk}"
-            " --numjobs=32 --direct=1 --ioengine=libaio --iodepth=32"
-            " --time_based --ramp_time=60 --runtime=600"
-            " --group_reporting=1 --output-format=json --output=fio.json"
+    instance_policy = 'warm'
+    serial_execute = True
+
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 steadystate=None, steadystate_duration=60, max_runtime=600,
+                 log_interval=None, **kwargs):
+        """Initialize FIO Test.
+
+        With a steadystate criterion such as iops_slope:0.1% each workload
+        ends as soon as the criterion holds over steadystate_duration
+        seconds, or after max_runtime seconds if it never does.
+
+        With a log_interval in milliseconds fio logs IOPS and bandwidth
+        averaged over each interval, which are split into a burst and a
+        baseline phase when throughput drops part way through a run.
+        """
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
         )
 
-    def run(self):
-        """Combine provision, execute, and cleanup and run iterations."""
-        for index in range(self.iterations):
-            self._log.info(
-                'running iteration %s of %s', str(index+1), self.iterations
-            )
-            self.provision()
-            self.execute()
-            self.cleanup()
-
-        self.analyze()
+        self.steadystate = steadystate
+        self.job_options = {'runtime': max_runtime}
+        if steadystate:
+            self.job_options.update({
+                'steadystate': steadystate,
+                'steadystate_duration': steadystate_duration,
+            })
+
+        self.log_interval = log_interval
+        self.fio_logs = {}
+        if log_interval:
+            # without a file name fio names logs after the job
+            self.job_options.update({
+                'write_iops_log': None,
+                'write_bw_log': None,
+                'log_avg_msec': log_interval,
+            })
+
+        self.read_results = ResultTable(FIO_COLUMNS, types={'io': 'q'})
+        self.write_results = ResultTable(FIO_COLUMNS, types={'io': 'q'})
+        self.read_histogram = LatencyHistogram()
+        self.write_histogram = LatencyHistogram()
+        self.raid_disk = None
+        self.profiles = FioProfiles()
 
     def provision(self):
         """Create and setup instances for testing."""
         self.instance = self.create_instance()
-        self.instance.execute('sudo apt-get update')
-        self.instance.execute('sudo apt-get install --yes fio')
+        self.install('fio')
 
     def execute(self):
         """Run the test."""
-        self.read_results.append(self._run_fio('read'))
-        self._log.info('sleeping between tests')
-        time.sleep(120)
-        self.write_results.append(self._run_fio('write'))
+        data = self._run_job(['read', 'write'], suffix='read-write')
+
+        return (
+            self._fio_result(data, 'read', job='read'),
+            self._fio_result(data, 'write', job='write'),
+        )
 
     def cleanup(self):
         """Tear down instances."""
-        self.instance.delete()
+        self.release_instance(self.instance)
+
+    def record(self, result):
+        """Store read and write results of an iteration."""
+        read, write = result
+        self.read_results.append_attributes(read)
+        self.write_results.append_attributes(write)
+        self.read_histogram.merge(read.histogram)
+        self.write_histogram.merge(write.histogram)
+
+    def primary_metrics(self, result):
+        """Watch read and write IOPS."""
+        return [data.iops for data in result]
 
     def analyze(self):
         """Analyze collected results and produce final output."""
@@ -89,11 +158,21 @@ class FioTest(BaseTest):
             'Command,fio',
             '\nRead',
             self._print_results(self.read_results),
+            self._print_histogram(self.read_histogram),
             '\nWrite',
             self._print_results(self.write_results),
+            self._print_histogram(self.write_histogram),
+            self.stop_summary(),
         ])
 
         self.save_to_file(self.csv_result, prefix='results')
+        self.save_to_file(
+            self.read_histogram.serialize(), prefix='histogram', suffix='read'
+        )
+        self.save_to_file(
+            self.write_histogram.serialize(), prefix='histogram',
+            suffix='write'
+        )
 
     @staticmethod
     def _calc_disk_mean(disks):
@@ -105,84 +184,193 @@ class FioTest(BaseTest):
         return total / len(disks)
 
     def _print_results(self, results):
-        """TODO."""
-        result = ['iteration,iops,bw,io,mean disk util']
-        for count, data in enumerate(results):
-            result.append('%s,%s' % (count+1, data))
+        """Format results with summary statistics.
+
+        Steady state and burst phases are only reported when enabled. The
+        iterations that never reached steady state or that throttled are
+        counted.
+        """
+        columns = [
+            name for name in FIO_COLUMNS
+            if (name not in STEADY_COLUMNS or self.steadystate) and
+            (name not in PHASE_COLUMNS or self.log_interval)
+        ]
+        fields = [field for field in FIO_FIELDS if field[0] in columns]
+        indexes = [FIO_COLUMNS.index(name) for name in columns]
+        row_format = ','.join(['%s'] + [field[2] for field in fields])
+
+        result = ['iteration,%s' % ','.join(field[1] for field in fields)]
+        for count, row in enumerate(results.rows()):
+            result.append(row_format % tuple(
+                [count+1] + [row[index] for index in indexes]
+            ))
+
+        result.extend(results.summary_csv(columns=columns))
+
+        if self.steadystate:
+            reached = sum(1 for steady in results.column('steady') if steady)
+            result.append(
+                '\nsteady state,%s,reached in %s of %s iterations' % (
+                    self.steadystate, reached, len(results)
+                )
+            )
 
-        result.append(self._calc_average(results))
-        result.append(self._calc_median(results))
-        if self.iterations > 1:
-            result.append(self._calc_stdev(results))
+        if self.log_interval:
+            throttled = sum(
+                1 for throttle in results.column('throttle')
+                if not math.isnan(throttle)
+            )
+            result.append('\nthrottled,in %s of %s iterations' % (
+                throttled, len(results)
+            ))
 
         return '\n'.join(result)
 
     @staticmethod
-    def _calc_average(results):
-        """Return averages of results."""
-        total = len(results)
+    def _print_histogram(histogram):
+        """Format percentiles of the latency of all iterations together."""
+        if not histogram.bins:
+            return ''
+
+        percentiles = histogram.percentiles(PERCENTILES)
+        return '\n'.join([
+            '\nmerged histogram,%s' % ','.join(
+                'clat p%g (us)' % percent for percent in PERCENTILES
+            ),
+            'all iterations,%s' % ','.join(
+                '%.1f' % (percentiles[percent] / 1000)
+                for percent in PERCENTILES
+            ),
+        ])
 
-        iops = sum([result.iops for result in results]) / total
-        bw = sum([result.bw for result in results]) / total
-        io = sum([result.io for result in results]) / total
-        util = sum([result.util for result in results]) / total
+    def _run_job(self, profiles, suffix, **options):
+        """Run library profiles in one fio process and return its data."""
+        self._log.info('running %s', ', '.join(profiles))
+        job = self.profiles.render(
+            profiles, self._target(), **dict(self.job_options, **options)
+        )
 
-        return '\naverage,%.3f,%.3f,%.3f,%.3f' % (iops, bw, io, util)
+        return self._run_job_file(job, suffix)
 
-    @staticmethod
-    def _calc_median(results):
-        """Return averages of results."""
-        iops = statistics.median([result.iops for result in results])
-        bw = statistics.median([result.bw for result in results])
-        io = statistics.median([result.io for result in results])
-        util = statistics.median([result.util for result in results])
+    def _target(self):
+        """Return the FIO_* variables of the file or device under test."""
+        return device_target(self.raid_disk)
 
-        return 'median,%.3f,%.3f,%.3f,%.3f' % (iops, bw, io, util)
+    def _run_job_file(self, job, suffix):
+        """Run a rendered fio job file and return its data."""
+        self.instance.execute("cat > job.fio <<'EOF'\n%sEOF" % job)
 
-    @staticmethod
-    def _calc_stdev(results):
-        """Return averages of results."""
-        iops = statistics.stdev([result.iops for result in results])
-        bw = statistics.stdev([result.bw for result in results])
-        io = statistics.stdev([result.io for result in results])
-        util = statistics.stdev([result.util for result in results])
-
-        return 'std dev,%.3f,%.3f,%.3f,%.3f' % (iops, bw, io, util)
-
-    def _run_fio(self, test):
-        """Run FIO itself."""
-        self._log.info('running %s test', test)
-        if self.raid_disk:
-            fio_cmd = self.fio_raid_disk.format(
-                name=test, type=test, disk=self.raid_disk
-            )
-        else:
-            fio_cmd = self.fio_boot_disk.format(name=test, type=test)
+        return self._fio_json(
+            'sudo fio job.fio --output-format=json+ --output=fio.json', suffix
+        )
 
+    def _fio_json(self, fio_cmd, suffix):
+        """Run a fio command that writes fio.json and return its data.
+
+        The output is copied into the log directory as a file instead of
+        printed over the command channel, and only the fields the results
+        use are parsed from it.
+        """
         self.instance.execute(fio_cmd)
-        output = self.instance.execute('sudo cat fio.json')
-        self.save_to_file(output, suffix=test)
+        path = self.log_file(suffix=suffix)
+        try:
+            self.instance.pull_file('fio.json', path)
+            data = load_fio_json(path)
+        except (OSError, ValueError) as error:
+            self._log.error(fio_cmd)
+            self._log.error('JSON result failure: %s', error)
+            data = None
+
+        if self.log_interval:
+            self.fio_logs = split_fio_logs(self.instance.execute(
+                'sudo tail -n +1 *_iops.*.log *_bw.*.log'
+            ))
 
         # clean up between tests
         self.instance.execute('sudo rm *')
 
-        try:
-            data = json.loads(output)
-        except json.decoder.JSONDecodeError:
-            self._log.error(fio_cmd)
-            self._log.error('JSON result failure:')
-            self._log.error(output)
+        if data is None:
             self.instance.delete()
             sys.exit(1)
 
+        return data
+
+    def _fio_result(self, data, direction, job=None):
+        """Return the FioResult of one direction of fio output.
+
+        With several workloads in the output, job picks the one to use by
+        name. Disk utilization is always that of the whole fio run.
+        """
+        if job:
+            data = dict(data, jobs=[
+                entry for entry in data['jobs'] if entry['jobname'] == job
+            ])
+
         result = FioResult()
-        result.iops = data['jobs'][0][test]['iops']
-        result.bw = data['jobs'][0][test]['bw']
-        result.io = data['jobs'][0][test]['io_bytes']
+        result.iops = data['jobs'][0][direction]['iops']
+        result.bw = data['jobs'][0][direction]['bw']
+        result.io = data['jobs'][0][direction]['io_bytes']
         result.util = self._calc_disk_mean(data['disk_util'])
 
+        clat, result.histogram = completion_latency(data, direction)
+        result.p50, result.p99, result.p999, result.p9999 = [
+            float('nan') if clat[percent] is None else clat[percent] / 1000
+            for percent in PERCENTILES
+        ]
+
+        job = data['jobs'][0]
+        if self.log_interval:
+            self._fio_phases(result, job['jobname'], direction)
+
+        result.runtime = job.get('job_runtime', 0) / 1000
+        if 'steadystate' in job:
+            result.steady = float(job['steadystate']['attained'])
+            if not result.steady:
+                self._log.warning(
+                    '%s did not reach steady state %s in %.fs',
+                    job['jobname'], job['steadystate'].get('criterion'),
+                    result.runtime
+                )
+
         return result
 
+    def _fio_phases(self, result, job, direction):
+        """Split the logged IOPS and bandwidth of a job into phases.
+
+        Both series are split at the change point of IOPS. Without a
+        drop the burst and baseline are the same and throttle is NaN.
+        """
+        iops = TimeSeries.from_fio_log(
+            self.fio_logs.get((job, 'iops'), ''), self.log_interval,
+            direction
+        )
+        bandwidth = TimeSeries.from_fio_log(
+            self.fio_logs.get((job, 'bw'), ''), self.log_interval, direction
+        )
+        self.save_to_file(
+            iops.to_csv('time,iops'), suffix='%s-%s-iops' % (job, direction)
+        )
+
+        if len(iops) == 0:
+            return
+
+        index = iops.phases()
+        if index is None:
+            result.burst_iops = result.baseline_iops = iops.mean()
+            result.burst_bw = result.baseline_bw = bandwidth.mean()
+            return
+
+        result.burst_iops = iops.mean(0, index)
+        result.baseline_iops = iops.mean(index)
+        result.burst_bw = bandwidth.mean(0, index)
+        result.baseline_bw = bandwidth.mean(index)
+        result.throttle = iops.times[index]
+        self._log.info(
+            '%s %s throttled after %.fs from %.f to %.f iops', job,
+            direction, result.throttle, result.burst_iops,
+            result.baseline_iops
+        )
+
 
 def _setup_args():
     """TODO."""
@@ -200,10 +388,10 @@ def _setup_args():
         '--release', required=True,
         help='Ubuntu release to test; default is latest LTS'
     )
-    parser.add_argument(
-        '--iterations', type=int, default=5,
-        help='number of test iterations to run'
-    )
+    add_iteration_args(parser, iterations=5)
+    add_pool_args(parser)
+    add_settle_args(parser)
+    add_steadystate_args(parser)
 
     return parser.parse_args()
 
@@ -214,7 +402,8 @@ def run_boot_testing():
 
     test = FioTest(
         'ec2', args.instance_type, args.release,
-        args.iterations, args.log_dir
+        args.iterations, args.log_dir,
+        **test_kwargs(args)
     )
 
     test.run()
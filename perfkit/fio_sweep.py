@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""FIO parameter sweep and saturation knee search.
+
+Runs a grid of block sizes, I/O depths, and job counts on a single
+instance to produce IOPS and latency curves. In search mode the I/O
+depth is bisected for each block size and job count to find the knee,
+the deepest queue before latency grows faster than throughput.
+"""
+
+import argparse
+import collections
+import sys
+
+from .arguments import (
+    add_iteration_args, add_pool_args, add_settle_args, comma_list,
+    test_kwargs
+)
+from .fio import FioTest
+from .results import ResultTable
+from .stats import summarize
+
+SweepPoint = collections.namedtuple(
+    'SweepPoint', 'bs numjobs iodepth iops bw clat p99'
+)
+
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+class FioSweepTest(FioTest):
+    """FIO Sweep Test Object."""
+
+    test_name = 'fio-sweep'
+
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 block_sizes=('4k', '64k', '1m'), iodepths=(1, 4, 16, 64),
+                 numjobs=(1, 4), readwrite='randread', search=False,
+                 max_iodepth=256, runtime=60, **kwargs):
+        """Initialize FIO Sweep Test."""
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
+
+        self.block_sizes = [size_bytes(size) for size in block_sizes]
+        self.iodepths = list(iodepths)
+        self.numjobs = list(numjobs)
+        self.readwrite = readwrite
+        self.direction = 'write' if 'write' in readwrite else 'read'
+        self.search = search
+        self.max_iodepth = max_iodepth
+        self.runtime = runtime
+
+        self.curve = ResultTable(
+            SweepPoint._fields,
+            types={'bs': 'q', 'numjobs': 'q', 'iodepth': 'q'}
+        )
+        self.knees = ResultTable(
+            ['bs', 'numjobs', 'iodepth'],
+            types={'bs': 'q', 'numjobs': 'q', 'iodepth': 'q'}
+        )
+
+    def execute(self):
+        """Run the sweep, return measured points and any knees found."""
+        points = []
+        knees = []
+        for block_size in self.block_sizes:
+            for numjobs in self.numjobs:
+                if self.search:
+                    knee, measured = self._find_knee(block_size, numjobs)
+                    knees.append((block_size, numjobs, knee))
+                    points.extend(measured)
+                else:
+                    points.extend(
+                        self._run_point(block_size, numjobs, iodepth)
+                        for iodepth in self.iodepths
+                    )
+
+        return points, knees
+
+    def record(self, result):
+        """Store the points and knees of an iteration."""
+        points, knees = result
+        for point in points:
+            self.curve.append(point)
+        for knee in knees:
+            self.knees.append(knee)
+
+    def primary_metrics(self, result):
+        """Watch the knee depths when searching, else the IOPS curve."""
+        points, knees = result
+        if self.search:
+            return [iodepth for _, _, iodepth in knees]
+
+        return [point.iops for point in points]
+
+    def analyze(self):
+        """Analyze collected results and produce final output."""
+        result = [
+            'FIO %s sweep of block size, numjobs, and iodepth'
+            % self.readwrite,
+            'Command,fio',
+            '\nbs,numjobs,iodepth,iops,bw,mean clat (us),clat p99 (us)',
+        ]
+
+        groups = collections.OrderedDict()
+        for row in sorted(self.curve.rows(), key=lambda row: row[:3]):
+            groups.setdefault(row[:3], []).append(row[3:])
+
+        # median of every metric over all iterations
+        for (block_size, numjobs, iodepth), rows in groups.items():
+            medians = [summarize(column).median for column in zip(*rows)]
+            result.append('%s,%s,%s,%.f,%.f,%.1f,%.1f' % (
+                size_label(block_size), numjobs, iodepth, *medians
+            ))
+
+        if self.search:
+            result.append('\nknee,bs,numjobs,iodepth')
+            for index, (block_size, numjobs, iodepth) in enumerate(
+                    self.knees.rows()):
+                result.append('%s,%s,%s,%s' % (
+                    index // (len(self.block_sizes) * len(self.numjobs)) + 1,
+                    size_label(block_size), numjobs, iodepth
+                ))
+
+        result.append(self.stop_summary())
+
+        self.csv_result = '\n'.join(result)
+        self.save_to_file(self.csv_result, prefix='results')
+
+    def _find_knee(self, block_size, numjobs):
+        """Bisect iodepth for the knee of one block size and job count.
+
+        Depths are powers of two up to max_iodepth. Going from one depth
+        to the next is saturated when latency grows by a larger factor
+        than IOPS. Assuming that once saturated deeper queues stay so, the
+        smallest saturated step is found in log2(steps) comparisons and
+        the depth it starts from is the knee. Returns the knee and the
+        points measured along the way.
+        """
+        depths = [1]
+        while depths[-1] * 2 <= self.max_iodepth:
+            depths.append(depths[-1] * 2)
+
+        measured = {}
+
+        def measure(iodepth):
+            """Run a point once, reusing earlier measurements."""
+            if iodepth not in measured:
+                measured[iodepth] = self._run_point(
+                    block_size, numjobs, iodepth
+                )
+            return measured[iodepth]
+
+        def saturated(index):
+            """Check if latency outgrows IOPS from one depth to the next.
+
+            A point without IOPS or latency, such as a failed or throttled
+            run, counts as saturated.
+            """
+            low = measure(depths[index])
+            high = measure(depths[index + 1])
+            if not all([low.iops, low.clat, high.iops, high.clat]):
+                return True
+
+            return high.clat / low.clat > high.iops / low.iops
+
+        low, high = 0, len(depths) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if saturated(middle):
+                high = middle
+            else:
+                low = middle + 1
+
+        knee = depths[low]
+        self._log.info(
+            'knee of bs=%s numjobs=%s at iodepth=%s after %s runs',
+            size_label(block_size), numjobs, knee, len(measured)
+        )
+
+        return knee, [measured[iodepth] for iodepth in sorted(measured)]
+
+    def _run_point(self, block_size, numjobs, iodepth):
+        """Run fio with one combination of parameters."""
+        self._log.info(
+            'running %s bs=%s numjobs=%s iodepth=%s', self.readwrite,
+            size_label(block_size), numjobs, iodepth
+        )
+        data = self._run_job(
+            [self.readwrite], '%s-%s-%s-%s' % (
+                self.readwrite, size_label(block_size), numjobs, iodepth
+            ),
+            bs=block_size, iodepth=iodepth, numjobs=numjobs,
+            runtime=self.runtime, ramp_time=10
+        )
+        self.settle()
+
+        result = self._fio_result(data, self.direction)
+        clat = data['jobs'][0][self.direction]['clat_ns']['mean'] / 1000
+
+        return SweepPoint(
+            block_size, numjobs, iodepth, result.iops, result.bw, clat,
+            result.p99
+        )
+
+
+def size_bytes(size):
+    """Convert a fio size such as 4k or 1m to bytes."""
+    size = str(size).lower()
+    if size[-1] in SIZE_UNITS:
+        return int(size[:-1]) * SIZE_UNITS[size[-1]]
+
+    return int(size)
+
+
+def size_label(size):
+    """Convert bytes to the shortest exact fio size such as 4k."""
+    for unit, scale in sorted(
+            SIZE_UNITS.items(), key=lambda item: item[1], reverse=True):
+        if size >= scale and size % scale == 0:
+            return '%s%s' % (size // scale, unit)
+
+    return str(size)
+
+
+def _setup_args():
+    """TODO."""
+    parser = argparse.ArgumentParser(
+        prog='fio-sweep',
+        description='Sweep fio block size, iodepth, and numjobs'
+    )
+
+    parser.add_argument(
+        '--log-dir', default='logs', help='dir to write logs'
+    )
+    parser.add_argument(
+        'instance_type', help='Instance type to test'
+    )
+    parser.add_argument(
+        '--release', required=True,
+        help='Ubuntu release to test; default is latest LTS'
+    )
+    parser.add_argument(
+        '--readwrite', default='randread',
+        choices=['read', 'write', 'randread', 'randwrite'],
+        help='fio I/O pattern to sweep'
+    )
+    parser.add_argument(
+        '--block-sizes', type=comma_list(str), default=['4k', '64k', '1m'],
+        help='comma separated block sizes'
+    )
+    parser.add_argument(
+        '--iodepths', type=comma_list(int), default=[1, 4, 16, 64],
+        help='comma separated I/O depths'
+    )
+    parser.add_argument(
+        '--numjobs', type=comma_list(int), default=[1, 4],
+        help='comma separated job counts'
+    )
+    parser.add_argument(
+        '--search', action='store_true',
+        help='bisect iodepth for the saturation knee instead of a grid'
+    )
+    parser.add_argument(
+        '--max-iodepth', type=int, default=256,
+        help='deepest I/O depth the knee search tries'
+    )
+    parser.add_argument(
+        '--runtime', type=int, default=60,
+        help='seconds to run each combination'
+    )
+    add_iteration_args(parser, iterations=1)
+    add_pool_args(parser)
+    add_settle_args(parser)
+
+    return parser.parse_args()
+
+
+def run_fio_sweep():
+    """TODO."""
+    args = _setup_args()
+
+    test = FioSweepTest(
+        'ec2', args.instance_type, args.release,
+        args.iterations, args.log_dir,
+        block_sizes=args.block_sizes, iodepths=args.iodepths,
+        numjobs=args.numjobs, readwrite=args.readwrite,
+        search=args.search, max_iodepth=args.max_iodepth,
+        runtime=args.runtime, **test_kwargs(args)
+    )
+
+    test.run()
+    print(test.csv_result)
+
+
+if __name__ == '__main__':
+    sys.exit(run_fio_sweep())
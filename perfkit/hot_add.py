@@ -3,9 +3,9 @@
 
 import argparse
 import sys
-import time
 
 from . import BaseTest
+from .arguments import add_settle_args, test_kwargs
 
 
 class HotAddTest(BaseTest):
@@ -14,9 +14,11 @@ class HotAddTest(BaseTest):
     test_name = 'hot-add'
 
     def __init__(self, cloud, instance_type, release, iterations, log_dir,
-                 num_network_devs=1, num_storage_devs=1):
+                 num_network_devs=1, num_storage_devs=1, **kwargs):
         """Initialize Hot-Add Test."""
-        super().__init__(cloud, instance_type, release, iterations, log_dir)
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
 
         self.dmesg = ''
         self.ip_a = ''
@@ -37,6 +39,8 @@ class HotAddTest(BaseTest):
 
     def execute(self):
         """Run the test."""
+        network_devs, storage_devs = self._count_devices()
+
         for index in range(self.num_network_devs):
             self._log.info('adding network device %s of %s',
                            index+1, self.num_network_devs)
@@ -48,8 +52,16 @@ class HotAddTest(BaseTest):
             self.instance.add_volume()
 
         # make sure we wait for everything to get added
-        self._log.info('sleeping to allow instance to settle')
-        time.sleep(60)
+        def devices_added():
+            """Check that all hot-added devices are visible."""
+            network, storage = self._count_devices()
+            return (network >= network_devs + self.num_network_devs and
+                    storage >= storage_devs + self.num_storage_devs)
+
+        self.settler.wait_for(
+            devices_added, 'hot-added devices to appear', max_wait=300
+        )
+        self.settle()
 
         self._log.info('collecting system information')
         self.dmesg = self.instance.execute('dmesg')
@@ -58,7 +70,7 @@ class HotAddTest(BaseTest):
 
     def cleanup(self):
         """Tear down instances."""
-        self.instance.delete()
+        self.release_instance(self.instance)
 
     def analyze(self):
         """Analyze collected results and produce final output."""
@@ -72,6 +84,15 @@ class HotAddTest(BaseTest):
 
         self.save_to_file(self.csv_result, prefix='results')
 
+    def _count_devices(self):
+        """Count network interfaces and block devices on the instance."""
+        network = self.instance.execute('ls /sys/class/net')
+        storage = self.instance.execute(
+            'lsblk --nodeps --noheadings --output NAME'
+        )
+
+        return len(network.split()), len(storage.split())
+
 
 def _setup_args():
     """TODO."""
@@ -98,6 +119,7 @@ def _setup_args():
         '--storage', type=int, default=1,
         help='Number of storage devices to add'
     )
+    add_settle_args(parser)
 
     return parser.parse_args()
 
@@ -108,7 +130,8 @@ def run_hot_add_testing():
 
     test = HotAddTest(
         'ec2', args.instance_type, args.release,
-        1, args.log_dir, args.network, args.storage
+        1, args.log_dir, args.network, args.storage,
+        **test_kwargs(args)
     )
 
     test.run()
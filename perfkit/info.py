@@ -6,6 +6,7 @@ import re
 import sys
 
 from . import BaseTest
+from .arguments import add_pool_args, test_kwargs
 
 
 class InfoTest(BaseTest):
@@ -20,10 +21,14 @@ class InfoTest(BaseTest):
     ]
 
     test_name = 'info'
+    instance_policy = 'warm'
 
-    def __init__(self, cloud, instance_type, release, iterations, log_dir):
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 **kwargs):
         """Initialize Info Collection Test."""
-        super().__init__(cloud, instance_type, release, iterations, log_dir)
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
 
         self.versions = {}
         self.datasource = ''
@@ -44,7 +49,7 @@ class InfoTest(BaseTest):
     def execute(self):
         """Run the test."""
         self._log.info('collecting versions')
-        self.instance.execute('sudo apt-get update')
+        self.install()
         self.versions['kernel'] = self.instance.execute('uname --r')
         for binary in self.binaries:
             self.versions[binary] = self._parse_version(binary)
@@ -60,7 +65,7 @@ class InfoTest(BaseTest):
 
     def cleanup(self):
         """Tear down instances."""
-        self.instance.delete()
+        self.release_instance(self.instance)
 
     def analyze(self):
         """Analyze collected results and produce final output."""
@@ -118,6 +123,7 @@ def _setup_args():
         '--release', required=True,
         help='Ubuntu release to test; default is latest LTS'
     )
+    add_pool_args(parser)
 
     return parser.parse_args()
 
@@ -127,7 +133,8 @@ def run_info_testing():
     args = _setup_args()
 
     test = InfoTest(
-        'ec2', args.instance_type, args.release, 1, args.log_dir
+        'ec2', args.instance_type, args.release, 1, args.log_dir,
+        **test_kwargs(args)
     )
 
     test.run()
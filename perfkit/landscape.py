@@ -10,7 +10,6 @@ import argparse
 import ast
 import json
 import sys
-import time
 import uuid
 
 from . import BaseTest
@@ -53,7 +52,7 @@ class LandscapeTest(BaseTest):
 
     def cleanup(self):
         """Tear down instances."""
-        self.instance.delete()
+        self.release_instance(self.instance)
 
     def analyze(self):
         """Analyze collected results and produce final output."""
@@ -69,23 +68,38 @@ class LandscapeTest(BaseTest):
 
     def _accept_computer(self):
         """Accept computer into Landscape."""
-        out, _ = self.subp('landscape-api get-pending-computers')
-        pending_computers = ast.literal_eval(out)
+        waited = self.settler.wait_for(
+            self._find_pending_computer, 'computer registration',
+            max_wait=300
+        )
+        if waited is None:
+            self._log.error('Computer never registered. Exiting.')
+            self.instance.delete()
+            sys.exit(1)
 
-        for pending in pending_computers:
-            if pending['title'] == self.computer_title:
-                self._log.info('accepting pending computer: %s', pending['id'])
-                out, _ = self.subp(
-                    'landscape-api accept-pending-computers %s' % pending['id']
-                )
-                self.computer_id = ast.literal_eval(out)[0]['id']
-                self._log.info('accepted computer: %s', self.computer_id)
+        for pending in self._find_pending_computer():
+            self._log.info('accepting pending computer: %s', pending['id'])
+            out, _ = self.subp(
+                'landscape-api accept-pending-computers %s' % pending['id']
+            )
+            self.computer_id = ast.literal_eval(out)[0]['id']
+            self._log.info('accepted computer: %s', self.computer_id)
 
         if not self.computer_id:
             self._log.error('No computer ID found. Exiting.')
             self.instance.delete()
             sys.exit(1)
 
+    def _find_pending_computer(self):
+        """Return pending computers with the title of this instance."""
+        out, _ = self.subp('landscape-api get-pending-computers')
+        pending_computers = ast.literal_eval(out)
+
+        return [
+            pending for pending in pending_computers
+            if pending['title'] == self.computer_title
+        ]
+
     def _get_computer(self):
         """Return computer based on id."""
         cmd = (
@@ -101,17 +115,24 @@ class LandscapeTest(BaseTest):
 
     def _get_hardware_info(self):
         """Get computer hardware info."""
-        while 'hardware' not in self.hardware_info:
-            self._log.info('sleeping to wait for hardware info')
-            time.sleep(30)
-
+        def has_hardware():
+            """Check if landscape received the hardware report."""
             self.hardware_info = self._get_computer()
+            return 'hardware' in self.hardware_info
+
+        waited = self.settler.wait_for(
+            has_hardware, 'hardware info', max_wait=1800, interval=15
+        )
+        if waited is None:
+            self._log.error('No hardware info received. Exiting.')
+            self.subp('landscape-api remove-computers %s' % self.computer_id)
+            self.instance.delete()
+            sys.exit(1)
 
     def _register_computer(self):
         """Register system with Landscape."""
         self._log.info('instaling client & registering system')
-        self.instance.execute('sudo apt-get update')
-        self.instance.execute('sudo apt-get install --yes landscape-client')
+        self.install('landscape-client')
 
         self.instance.execute(
             'sudo landscape-config --computer-title "%s"'
@@ -119,10 +140,6 @@ class LandscapeTest(BaseTest):
             % self.computer_title
         )
 
-        # wait for system to be registered
-        self._log.info('sleeping to allow registration')
-        time.sleep(10)
-
 
 def _setup_args():
     """TODO."""
@@ -2,67 +2,141 @@
 """Netperf Testing."""
 
 import argparse
-import statistics
+import collections
+import math
+import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from parse.log.netperf import (
+    LATENCY_SELECTORS, global_options, keyed_output, measured, selectors
+)
 
 from . import BaseTest
+from .arguments import (
+    add_iteration_args, add_placement_args, add_pool_args, add_settle_args,
+    percent, positive_int, test_kwargs
+)
+from .results import ResultTable
+from .timeseries import TimeSeries
+
+FLOW_HEADER = re.compile(r'^==> flow\.(\d+) <==$')
+
+RR_TESTS = ('TCP_RR', 'UDP_RR')
+RR_COLUMNS = ['throughput', 'p50', 'p90', 'p99', 'mean', 'stddev']
+ANOMALIES = ['collapse', 'dips']
+
+# seconds netperf runs each test
+DURATION = 600
 
 
 class NetperfTest(BaseTest):
     """Netperf Test Object."""
 
     test_name = 'netperf'
+    instance_policy = 'warm'
+
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 rr_tests=RR_TESTS, interim=None, min_drop=0.2,
+                 stop_on_anomaly=False, placement_group=None, **kwargs):
+        """Initialize Netperf Test.
+
+        Client and server share an availability zone, and with
+        placement_group are launched into that cluster placement group.
+        With interim seconds netperf prints a result every interval, which
+        is read while the test runs. A test whose throughput collapses, or
+        dips at least min_drop below its median more than once, is
+        flagged, and stopped at once with stop_on_anomaly.
+        """
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
 
-    def __init__(self, cloud, instance_type, release, iterations, log_dir):
-        """Initialize Netperf Test."""
-        super().__init__(cloud, instance_type, release, iterations, log_dir)
+        self.interim = interim
+        self.min_drop = min_drop
+        self.stop_on_anomaly = stop_on_anomaly
+        self.anomalies = collections.OrderedDict()
+        self.anomaly_counts = collections.Counter()
 
+        self.placement_group = placement_group
         self.slave = None
-        self.tcp_send = []
-        self.udp_send = []
-        self.tcp_receive = []
-
-    def run(self):
-        """Combine provision, execute, and cleanup and run iterations."""
-        for index in range(self.iterations):
-            self._log.info(
-                'running iteration %s of %s', str(index+1), self.iterations
-            )
-            self.provision()
-            self.execute()
-            self.cleanup()
-
-        self.analyze()
+        self.client_ip = None
+        self.server_ip = None
+        self.cpus = None
+        self.bandwidth = ResultTable(['tcp_send', 'udp_send', 'tcp_receive'])
+        self.rr_tests = list(rr_tests)
+        self.latency = collections.OrderedDict(
+            (test, ResultTable(RR_COLUMNS)) for test in self.rr_tests
+        )
 
     def provision(self):
-        """Create and setup instances for testing."""
-        self.instance = self.create_instance()
-        self.instance.execute('sudo apt-get update')
-        self.instance.execute('sudo apt-get install --yes netperf')
+        """Create and setup instances for testing.
+
+        The server is requested right after the client, in the zone the
+        client was placed in, without waiting for the client to boot. Both
+        then boot and install netperf at the same time. Addresses and the
+        client CPU count are read once here for every test to use.
+        """
+        kwargs = {}
+        if self.placement_group:
+            kwargs['Placement'] = {'GroupName': self.placement_group}
+        self.instance = self.create_instance(wait=False, **kwargs)
 
         # place both in the same availability zone
-        placement = {
-            'AvailabilityZone': self.instance.availability_zone
-        }
-        self.slave = self.create_instance(Placement=placement)
-        self.slave.execute('sudo apt-get update')
-        self.slave.execute('sudo apt-get install --yes netperf')
+        placement = dict(
+            kwargs.get('Placement', {}),
+            AvailabilityZone=self.instance.availability_zone
+        )
+        self.slave = self.create_instance(wait=False, Placement=placement)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            client, server = executor.map(
+                self._prepare, [self.instance, self.slave]
+            )
+        self.client_ip, self.cpus = client
+        self.server_ip, _ = server
 
     def execute(self):
-        """Run the test."""
-        self.tcp_send.append(self._run_netperf(test='TCP_STREAM'))
-        self._log.info('sleeping between tests')
-        time.sleep(120)
-        self.udp_send.append(self._run_netperf(test='UDP_STREAM'))
-        self._log.info('sleeping between tests')
-        time.sleep(120)
-        self.tcp_receive.append(self._run_netperf(test='TCP_MAERTS'))
+        """Run the test, return bandwidth, request/response, and anomalies.
+
+        Anomalies are the kind of anomaly flagged in each test and whether
+        it was stopped early, for tests with interim results.
+        """
+        self.anomalies = collections.OrderedDict()
+        tcp_send = self._run_netperf(test='TCP_STREAM')
+        self._settle_both()
+        udp_send = self._run_netperf(test='UDP_STREAM')
+        self._settle_both()
+        tcp_receive = self._run_netperf(test='TCP_MAERTS')
+
+        latency = collections.OrderedDict()
+        for test in self.rr_tests:
+            self._settle_both()
+            latency[test] = self._run_rr(test)
+
+        return (tcp_send, udp_send, tcp_receive), latency, self.anomalies
 
     def cleanup(self):
         """Tear down instances."""
-        self.slave.delete()
-        self.instance.delete()
+        self.release_instance(self.slave)
+        self.release_instance(self.instance)
+
+    def record(self, result):
+        """Store bandwidth and request/response results of an iteration."""
+        bandwidth, latency, anomalies = result
+        self.bandwidth.append(bandwidth)
+        for test, row in latency.items():
+            self.latency[test].append(row)
+        for test, (kind, stopped) in anomalies.items():
+            self.anomaly_counts[(test, kind)] += 1
+            if stopped:
+                self.anomaly_counts[(test, 'stopped')] += 1
+
+    def primary_metrics(self, result):
+        """Watch bandwidth and transaction rates."""
+        bandwidth, latency, _ = result
+        return list(bandwidth) + [row[0] for row in latency.values()]
 
     def analyze(self):
         """Analyze collected results and produce final output."""
@@ -72,54 +146,69 @@ class NetperfTest(BaseTest):
             '\niteration,TCP send,UDP send,TCP receive'
         ]
 
-        for index, (tcp_s, udp_s, tcp_r) in enumerate(
-                zip(self.tcp_send, self.udp_send, self.tcp_receive)):
-            result.append('%s,%s,%s,%s' % (index, tcp_s, udp_s, tcp_r))
+        for index, row in enumerate(self.bandwidth.rows()):
+            result.append('%s,%s,%s,%s' % ((index,) + row))
 
-        result.append(self._calc_average())
-        result.append(self._calc_median())
-        if self.iterations > 1:
-            result.append(self._calc_stdev())
+        result.extend(self.bandwidth.summary_csv(precision=2))
+
+        for test, table in self.latency.items():
+            result.extend([
+                '\n%s latency (us)' % test,
+                'iteration,transactions/s,p50,p90,p99,mean,std dev',
+            ])
+            for index, row in enumerate(table.rows()):
+                result.append('%s,%.2f,%.1f,%.1f,%.1f,%.1f,%.1f' % (
+                    (index + 1,) + row
+                ))
+            result.extend(table.summary_csv(precision=2))
+
+        if self.interim:
+            result.append(self._print_anomalies())
+
+        result.append(self.stop_summary())
 
         self.csv_result = '\n'.join(result)
         self.save_to_file(self.csv_result, prefix='results')
 
-    def _calc_average(self):
-        """Return averages of results."""
-        return '\naverage,%.2f,%.2f,%.2f' % (
-            sum(self.tcp_send)/len(self.tcp_send),
-            sum(self.udp_send)/len(self.udp_send),
-            sum(self.tcp_receive)/len(self.tcp_receive),
-        )
+    def _print_anomalies(self):
+        """Format how many iterations of each test were flagged."""
+        tests = ['TCP_STREAM', 'UDP_STREAM', 'TCP_MAERTS'] + self.rr_tests
+        result = [
+            '\ninterim results,every %ss' % self.interim,
+            'test,%s,stopped early' % ','.join(ANOMALIES),
+        ]
+        for test in tests:
+            result.append('%s,%s' % (test, ','.join(
+                str(self.anomaly_counts[(test, kind)])
+                for kind in ANOMALIES + ['stopped']
+            )))
 
-    def _calc_median(self):
-        """Return averages of results."""
-        return 'median,%.2f,%.2f,%.2f' % (
-            statistics.median(self.tcp_send),
-            statistics.median(self.udp_send),
-            statistics.median(self.tcp_receive),
-        )
+        return '\n'.join(result)
 
-    def _calc_stdev(self):
-        """Return averages of results."""
-        return 'std dev,%.2f,%.2f,%.2f' % (
-            statistics.stdev(self.tcp_send),
-            statistics.stdev(self.udp_send),
-            statistics.stdev(self.tcp_receive),
-        )
+    def _prepare(self, instance):
+        """Wait for an instance, install netperf, return its IP and CPUs."""
+        instance.wait()
+        self.install('netperf', instance=instance)
+
+        address = instance.execute('hostname -I').split()[0]
+        cpus = int(instance.execute('grep -c processor /proc/cpuinfo'))
+
+        return address, cpus
+
+    def _settle_both(self):
+        """Wait for both client and server to be quiet."""
+        self.settle(self.instance)
+        self.settle(self.slave)
 
     def _run_netperf(self, test):
-        """Run netperf."""
-        self._log.info('running %s', test)
-        cpus = self.instance.execute('grep -c processor /proc/cpuinfo')
-        slave_ip = self.slave.execute('hostname -I')
-        netperf_cmd = (
-            'sudo netperf -t {test} -H {server} -l 600 -c -C'
-            ' -n {cpus}'.format(test=test, server=slave_ip, cpus=cpus)
-        )
+        """Run a stream test and return its throughput.
 
-        output = self.instance.execute(netperf_cmd)
-        self.save_to_file(output, suffix=test)
+        Output from netperf builds without keyed omni output is read by
+        position.
+        """
+        keyed, output = self._netperf(test)
+        if 'THROUGHPUT' in keyed:
+            return keyed['THROUGHPUT']
 
         if test == 'UDP_STREAM':
             result = self._netperf_output_bw(output, -2, 5)
@@ -128,6 +217,157 @@ class NetperfTest(BaseTest):
 
         return float(result)
 
+    def _run_rr(self, test):
+        """Run a request/response test, return its rate and latencies.
+
+        Latencies are in microseconds and NaN if netperf did not report
+        or measure them.
+        """
+        keyed, _ = self._netperf(test)
+
+        values = [
+            measured(keyed, selector)
+            for selector in ['THROUGHPUT'] + LATENCY_SELECTORS
+        ]
+        return [float('nan') if value is None else value for value in values]
+
+    def _netperf(self, test):
+        """Run netperf with keyed output, return its fields and output."""
+        self._log.info('running %s', test)
+        options = global_options(test)
+        if self.interim:
+            options.append('-D %s' % self.interim)
+        netperf_cmd = (
+            'sudo netperf -t {test} -H {server} -l {duration} -c -C'
+            ' -n {cpus}{options} -- -k {selectors}'.format(
+                test=test, server=self.server_ip, duration=DURATION,
+                cpus=self.cpus,
+                options=''.join(' ' + option for option in options),
+                selectors=','.join(selectors(test))
+            )
+        )
+
+        if self.interim:
+            output = self._netperf_interim(netperf_cmd, test)
+        else:
+            output = self.instance.execute(netperf_cmd)
+        self.save_to_file(output, suffix=test)
+
+        return keyed_output(output), output
+
+    def _netperf_interim(self, netperf_cmd, test):
+        """Run netperf in the background, reading interim results as it runs.
+
+        The output is polled every interim interval. Once the throughput
+        collapses or dips repeatedly the test is flagged and, if asked
+        to, interrupted so netperf ends early and prints its results for
+        the time it ran.
+        """
+        self.instance.execute(
+            'nohup %s > netperf.out 2>&1 & echo $! > netperf.pid' % netperf_cmd
+        )
+
+        deadline = time.time() + DURATION + 10 * self.interim
+        series = TimeSeries()
+        while time.time() < deadline:
+            time.sleep(self.interim)
+            running = self.instance.execute(
+                'ps -p $(cat netperf.pid) > /dev/null && echo running'
+            ).strip()
+            output = self.instance.execute('cat netperf.out')
+            series = TimeSeries.from_netperf_interim(output)
+            if not running:
+                break
+
+            kind = self._anomaly(series)
+            if kind and test not in self.anomalies:
+                self._log.warning(
+                    '%s throughput %s after %.fs', test,
+                    'collapsed' if kind == 'collapse' else 'dipped',
+                    series.times[-1]
+                )
+                self.anomalies[test] = (kind, self.stop_on_anomaly)
+                if self.stop_on_anomaly:
+                    self.instance.execute('sudo kill -INT $(cat netperf.pid)')
+
+        kind = self._anomaly(series)
+        if kind and test not in self.anomalies:
+            self.anomalies[test] = (kind, False)
+
+        self.save_to_file(
+            series.to_csv('time,throughput'), suffix='%s-interim' % test
+        )
+        self.instance.execute('rm -f netperf.out netperf.pid')
+
+        return output
+
+    def _anomaly(self, series):
+        """Return the kind of anomaly in interim results, None if none.
+
+        A collapse is a lasting drop of at least min_drop, dips are two
+        or more recovered drops below the median by that much. A series
+        without results yet, as before netperf prints its first interim
+        result or when it failed, has no anomaly.
+        """
+        if not series:
+            return None
+        if series.phases(min_drop=self.min_drop) is not None:
+            return 'collapse'
+        if len(series.dips(min_drop=self.min_drop)) > 1:
+            return 'dips'
+
+        return None
+
+    def _run_flows(self, test, flows, duration=60, options=''):
+        """Run concurrent netperf flows, return throughput of each flow.
+
+        Flow i runs on CPU i of the client and the server, wrapping around
+        when there are more flows than CPUs, so flows are spread over all
+        CPUs rather than left to the scheduler. Options are added to the
+        test specific options of every flow. A flow that failed has a
+        throughput of NaN.
+        """
+        self._log.info('running %s with %s flows', test, flows)
+
+        commands = [
+            'sudo netperf -t {test} -H {server} -l {duration} -T {cpu},{cpu}'
+            ' -P 0 -- -o THROUGHPUT{options} > flow.{flow} 2>&1 &'.format(
+                test=test, server=self.server_ip, duration=duration,
+                cpu=flow % self.cpus, options=' ' + options if options else '',
+                flow=flow
+            )
+            for flow in range(flows)
+        ]
+        self.instance.execute(' '.join(commands + ['wait']))
+        output = self.instance.execute('tail -v -n +1 flow.*; rm -f flow.*')
+        self.save_to_file(output, suffix='%s-%s' % (test, flows))
+
+        return self._flow_throughputs(output, flows)
+
+    def _flow_throughputs(self, output, flows):
+        """Return throughput of each flow from the output of all flows."""
+        throughputs = [float('nan')] * flows
+        flow = None
+        for line in output.splitlines():
+            match = FLOW_HEADER.match(line.strip())
+            if match:
+                flow = int(match.group(1))
+                continue
+
+            if flow is None or not line.strip():
+                continue
+            try:
+                throughputs[flow] = float(line)
+            except ValueError:
+                # netperf printed an error instead of a result
+                continue
+
+        failed = sum(1 for value in throughputs if math.isnan(value))
+        if failed:
+            self._log.warning('%s of %s flows failed', failed, flows)
+
+        return throughputs
+
     @staticmethod
     def _netperf_output_bw(text, line, field):
         """Return specific field from line in raw netperf output."""
@@ -152,9 +392,27 @@ def _setup_args():
         help='Ubuntu release to test; default is latest LTS'
     )
     parser.add_argument(
-        '--iterations', type=int, default=4,
-        help='number of test iterations to run'
+        '--no-rr', action='store_true',
+        help='skip the TCP_RR and UDP_RR latency tests'
+    )
+    parser.add_argument(
+        '--interim', type=positive_int,
+        help='read netperf interim results every this many seconds and'
+        ' flag throughput collapses and dips'
+    )
+    parser.add_argument(
+        '--min-drop', type=percent, default=0.2,
+        help='percent below normal throughput that counts as a collapse or'
+        ' dip; default 20'
+    )
+    parser.add_argument(
+        '--stop-on-anomaly', action='store_true',
+        help='end a test early once a collapse or dips are flagged'
     )
+    add_placement_args(parser)
+    add_iteration_args(parser, iterations=4)
+    add_pool_args(parser)
+    add_settle_args(parser)
 
     return parser.parse_args()
 
@@ -165,7 +423,10 @@ def run_netperf_testing():
 
     test = NetperfTest(
         'ec2', args.instance_type, args.release,
-        args.iterations, args.log_dir
+        args.iterations, args.log_dir,
+        rr_tests=() if args.no_rr else RR_TESTS, interim=args.interim,
+        min_drop=args.min_drop, stop_on_anomaly=args.stop_on_anomaly,
+        **test_kwargs(args)
     )
 
     test.run()
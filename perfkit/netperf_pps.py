@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Netperf small-packet rate and multi-queue scaling.
+
+Small messages are sent over a growing number of flows to find the
+packets per second limit rather than the bandwidth limit. Interface,
+NIC queue interrupt, and softnet counters are sampled on both ends over
+the middle of each run to show how packets spread over queues and CPUs,
+and the flow count where the rate plateaus or drops begin is reported.
+"""
+
+import argparse
+import collections
+import math
+import sys
+
+from .arguments import (
+    add_iteration_args, add_placement_args, add_pool_args, add_settle_args,
+    comma_list, percent, positive_int, test_kwargs
+)
+from .netperf_streams import NetperfStreamsTest
+from .netstat import busy, collect_samples, interface_to, start_sampling
+from .results import ResultTable
+from .stats import jain_fairness, summarize
+
+PpsPoint = collections.namedtuple(
+    'PpsPoint',
+    'flows total tx_pps loss fairness rx_queues rx_queue_fairness rx_cpus'
+    ' dropped squeezed tx_queues'
+)
+
+# part of sent packets that may go missing before counting as drops
+MAX_LOSS = 0.01
+
+
+class NetperfPpsTest(NetperfStreamsTest):
+    """Netperf Packet Rate Test Object."""
+
+    test_name = 'netperf-pps'
+
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 test='UDP_STREAM', message_size=64, max_loss=MAX_LOSS,
+                 **kwargs):
+        """Initialize Netperf Packet Rate Test.
+
+        Flows run test with messages of message_size bytes, with Nagle
+        off for TCP so each message leaves as its own packet.
+        """
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, test=test,
+            **kwargs
+        )
+
+        self.message_size = message_size
+        self.max_loss = max_loss
+        self.interfaces = None
+
+        self.curve = ResultTable(PpsPoint._fields, types={'flows': 'q'})
+        self.plateaus = ResultTable(
+            ['flows', 'total', 'drops'], types={'flows': 'q'}
+        )
+
+    def execute(self):
+        """Run the flow counts, return the points, plateau, and drops."""
+        self.interfaces = (
+            interface_to(self.instance, self.server_ip),
+            interface_to(self.slave, self.client_ip),
+        )
+
+        points, plateau = super().execute()
+        drops = next(
+            (point.flows for point in points
+             if point.dropped > 0 or point.loss > self.max_loss),
+            float('nan')
+        )
+        if not math.isnan(drops):
+            self._log.info('drops began at %s flows', drops)
+
+        return points, plateau + (drops,)
+
+    def record(self, result):
+        """Store the points, plateau, and drop point of an iteration."""
+        points, plateau = result
+        for point in points:
+            self.curve.append(point)
+        self.plateaus.append(plateau)
+
+    def primary_metrics(self, result):
+        """Watch the packet rate at the plateau."""
+        _, (_, total, _) = result
+        return [total]
+
+    def analyze(self):
+        """Analyze collected results and produce final output."""
+        result = [
+            '%s packet rate with %s byte messages' % (
+                self.test, self.message_size
+            ),
+            'Command,netperf',
+            'Duration (s),%s' % self.duration,
+            '\nflows,rx pps,tx pps,loss,flow fairness,rx busy queues,'
+            'rx queue fairness,rx busy cpus,softnet dropped,'
+            'softnet squeezed,tx busy queues',
+        ]
+
+        groups = collections.OrderedDict()
+        for row in sorted(self.curve.rows()):
+            groups.setdefault(row[0], []).append(row[1:])
+
+        # median of every metric over all iterations
+        for flows, rows in groups.items():
+            medians = [summarize(column).median for column in zip(*rows)]
+            result.append(
+                '%s,%.f,%.f,%.4f,%.3f,%.f,%.3f,%.f,%.f,%.f,%.f' % (
+                    flows, *medians
+                )
+            )
+
+        result.append('\niteration,plateau flows,plateau rx pps,drops flows')
+        for index, row in enumerate(self.plateaus.rows()):
+            result.append('%s,%s,%.f,%s' % (
+                index + 1, row[0], row[1],
+                '' if math.isnan(row[2]) else '%.f' % row[2]
+            ))
+        result.extend(self.plateaus.summary_csv(precision=0))
+        result.append(self.stop_summary())
+
+        self.csv_result = '\n'.join(result)
+        self.save_to_file(self.csv_result, prefix='results')
+
+    def _run_point(self, flows):
+        """Run a number of flows and sample counters on both ends.
+
+        Counters are sampled 10% and 90% into the run so start up and
+        tear down of the flows are left out. The server receives, so its
+        interface gives the packet rate and its counters the spread.
+        """
+        client_interface, server_interface = self.interfaces
+        start, end = self.duration * 0.1, self.duration * 0.9
+        start_sampling(self.instance, client_interface, start, end)
+        start_sampling(self.slave, server_interface, start, end)
+
+        options = '-m %s' % self.message_size
+        if self.test.startswith('TCP'):
+            options += ' -D'
+        throughputs = [
+            value for value in self._run_flows(
+                self.test, flows, duration=self.duration, options=options
+            )
+            if not math.isnan(value)
+        ]
+
+        fairness = jain_fairness(throughputs) if throughputs else float('nan')
+        client = collect_samples(self.instance, client_interface)
+        server = collect_samples(self.slave, server_interface)
+        if client is None or server is None:
+            self._log.warning(
+                'counters of %s flows were not sampled, flows ended early',
+                flows
+            )
+            nan = float('nan')
+            return PpsPoint(
+                flows, nan, nan, nan, fairness, nan, nan, nan, nan, nan, nan
+            )
+
+        loss = 0.0
+        if client['tx_pps']:
+            loss = max(0.0, 1 - server['rx_pps'] / client['tx_pps'])
+
+        return PpsPoint(
+            flows, server['rx_pps'], client['tx_pps'], loss,
+            fairness, busy(server['queues']), jain_fairness(server['queues']),
+            busy(server['processed']), server['dropped'],
+            server['squeezed'], busy(client['queues'])
+        )
+
+
+def _setup_args():
+    """TODO."""
+    parser = argparse.ArgumentParser(
+        prog='netperf-pps',
+        description='Small-packet rate over a growing number of flows'
+    )
+
+    parser.add_argument(
+        '--log-dir', default='logs', help='dir to write logs'
+    )
+    parser.add_argument(
+        'instance_type', help='Instance type to test'
+    )
+    parser.add_argument(
+        '--release', required=True,
+        help='Ubuntu release to test; default is latest LTS'
+    )
+    parser.add_argument(
+        '--test', default='UDP_STREAM', choices=['UDP_STREAM', 'TCP_STREAM'],
+        help='netperf test each flow runs'
+    )
+    parser.add_argument(
+        '--message-size', type=positive_int, default=64,
+        help='bytes sent in each message'
+    )
+    parser.add_argument(
+        '--flows', type=comma_list(positive_int),
+        help='comma separated flow counts to run instead of the sweep'
+    )
+    parser.add_argument(
+        '--max-flows', type=positive_int, default=64,
+        help='most flows the sweep tries'
+    )
+    parser.add_argument(
+        '--min-gain', type=percent, default=0.05,
+        help='smallest percent increase of the packet rate that continues'
+        ' the sweep; default 5'
+    )
+    parser.add_argument(
+        '--max-loss', type=percent, default=MAX_LOSS,
+        help='percent of sent packets that may not arrive before drops'
+        ' are reported; default 1'
+    )
+    parser.add_argument(
+        '--duration', type=positive_int, default=60,
+        help='seconds to run each flow count'
+    )
+    add_placement_args(parser)
+    add_iteration_args(parser, iterations=1)
+    add_pool_args(parser)
+    add_settle_args(parser)
+
+    return parser.parse_args()
+
+
+def run_netperf_pps():
+    """TODO."""
+    args = _setup_args()
+
+    test = NetperfPpsTest(
+        'ec2', args.instance_type, args.release,
+        args.iterations, args.log_dir,
+        test=args.test, message_size=args.message_size, flows=args.flows,
+        max_flows=args.max_flows, min_gain=args.min_gain,
+        max_loss=args.max_loss, duration=args.duration,
+        **test_kwargs(args)
+    )
+
+    test.run()
+    print(test.csv_result)
+
+
+if __name__ == '__main__':
+    sys.exit(run_netperf_pps())
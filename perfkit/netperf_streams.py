@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Netperf multi-stream aggregate throughput.
+
+A single flow is limited to a fraction of the link bandwidth, so M
+concurrent netperf streams pinned across CPUs run between the two
+instances and their throughput is summed. The number of flows doubles
+until the aggregate stops increasing to find where the link plateaus.
+"""
+
+import argparse
+import collections
+import math
+import sys
+
+from .arguments import (
+    add_iteration_args, add_placement_args, add_pool_args, add_settle_args,
+    comma_list, percent, positive_int, test_kwargs
+)
+from .netperf import NetperfTest
+from .results import ResultTable
+from .stats import jain_fairness, summarize
+
+FlowPoint = collections.namedtuple(
+    'FlowPoint', 'flows total mean min max fairness'
+)
+
+
+class NetperfStreamsTest(NetperfTest):
+    """Netperf Multi-Stream Test Object."""
+
+    test_name = 'netperf-streams'
+
+    def __init__(self, cloud, instance_type, release, iterations, log_dir,
+                 test='TCP_STREAM', flows=None, max_flows=64, min_gain=0.05,
+                 duration=60, **kwargs):
+        """Initialize Netperf Multi-Stream Test.
+
+        With a list of flows only those counts are run, otherwise the
+        count doubles from one up to max_flows and stops once the
+        aggregate grows by less than min_gain.
+        """
+        super().__init__(
+            cloud, instance_type, release, iterations, log_dir, **kwargs
+        )
+
+        self.test = test
+        self.flows = list(flows or [])
+        self.max_flows = max_flows
+        self.min_gain = min_gain
+        self.duration = duration
+
+        self.curve = ResultTable(FlowPoint._fields, types={'flows': 'q'})
+        self.plateaus = ResultTable(['flows', 'total'], types={'flows': 'q'})
+
+    def execute(self):
+        """Run the flow counts, return the points and the plateau."""
+        points = []
+        for flows in self._flow_counts():
+            if points:
+                self._settle_both()
+            points.append(self._run_point(flows))
+
+            if not self.flows and len(points) > 1:
+                previous, current = points[-2].total, points[-1].total
+                if current < previous * (1 + self.min_gain):
+                    self._log.info(
+                        'aggregate stopped increasing at %s flows', flows
+                    )
+                    break
+
+        return points, self._plateau(points)
+
+    def record(self, result):
+        """Store the points and plateau of an iteration."""
+        points, plateau = result
+        for point in points:
+            self.curve.append(point)
+        self.plateaus.append(plateau)
+
+    def primary_metrics(self, result):
+        """Watch the aggregate throughput at the plateau."""
+        _, (_, total) = result
+        return [total]
+
+    def analyze(self):
+        """Analyze collected results and produce final output."""
+        result = [
+            'Multi-stream %s aggregate performance' % self.test,
+            'Command,netperf',
+            'Duration (s),%s' % self.duration,
+            'Units,10^6 bits/s',
+            '\nflows,total,mean per flow,min per flow,max per flow,fairness',
+        ]
+
+        groups = collections.OrderedDict()
+        for row in sorted(self.curve.rows()):
+            groups.setdefault(row[0], []).append(row[1:])
+
+        # median of every metric over all iterations
+        for flows, rows in groups.items():
+            medians = [summarize(column).median for column in zip(*rows)]
+            result.append('%s,%.2f,%.2f,%.2f,%.2f,%.3f' % (flows, *medians))
+
+        result.append('\niteration,plateau flows,plateau total')
+        for index, row in enumerate(self.plateaus.rows()):
+            result.append('%s,%s,%.2f' % ((index + 1,) + row))
+        result.extend(self.plateaus.summary_csv(precision=2))
+        result.append(self.stop_summary())
+
+        self.csv_result = '\n'.join(result)
+        self.save_to_file(self.csv_result, prefix='results')
+
+    def _flow_counts(self):
+        """Return the flow counts to run in order."""
+        if self.flows:
+            return self.flows
+
+        counts = [1]
+        while counts[-1] * 2 <= self.max_flows:
+            counts.append(counts[-1] * 2)
+
+        return counts
+
+    def _plateau(self, points):
+        """Return the fewest flows within min_gain of the best aggregate."""
+        measured = [point for point in points if not math.isnan(point.total)]
+        if not measured:
+            return points[-1].flows, float('nan')
+
+        best = max(point.total for point in measured)
+        plateau = min(
+            (point for point in measured
+             if point.total >= best * (1 - self.min_gain)),
+            key=lambda point: point.flows
+        )
+
+        return plateau.flows, plateau.total
+
+    def _run_point(self, flows):
+        """Run a number of flows and summarize their throughput."""
+        throughputs = [
+            value for value in self._run_flows(
+                self.test, flows, duration=self.duration
+            )
+            if not math.isnan(value)
+        ]
+        if not throughputs:
+            return FlowPoint(flows, *[float('nan')] * 5)
+
+        return FlowPoint(
+            flows, sum(throughputs), sum(throughputs) / len(throughputs),
+            min(throughputs), max(throughputs), jain_fairness(throughputs)
+        )
+
+
+def _setup_args():
+    """TODO."""
+    parser = argparse.ArgumentParser(
+        prog='netperf-streams',
+        description='Aggregate throughput of concurrent netperf streams'
+    )
+
+    parser.add_argument(
+        '--log-dir', default='logs', help='dir to write logs'
+    )
+    parser.add_argument(
+        'instance_type', help='Instance type to test'
+    )
+    parser.add_argument(
+        '--release', required=True,
+        help='Ubuntu release to test; default is latest LTS'
+    )
+    parser.add_argument(
+        '--test', default='TCP_STREAM', choices=['TCP_STREAM', 'TCP_MAERTS'],
+        help='netperf test each flow runs'
+    )
+    parser.add_argument(
+        '--flows', type=comma_list(positive_int),
+        help='comma separated flow counts to run instead of the sweep'
+    )
+    parser.add_argument(
+        '--max-flows', type=positive_int, default=64,
+        help='most flows the sweep tries'
+    )
+    parser.add_argument(
+        '--min-gain', type=percent, default=0.05,
+        help='smallest percent increase of the aggregate that continues'
+        ' the sweep; default 5'
+    )
+    parser.add_argument(
+        '--duration', type=positive_int, default=60,
+        help='seconds to run each flow count'
+    )
+    add_placement_args(parser)
+    add_iteration_args(parser, iterations=1)
+    add_pool_args(parser)
+    add_settle_args(parser)
+
+    return parser.parse_args()
+
+
+def run_netperf_streams():
+    """TODO."""
+    args = _setup_args()
+
+    test = NetperfStreamsTest(
+        'ec2', args.instance_type, args.release,
+        args.iterations, args.log_dir,
+        test=args.test, flows=args.flows, max_flows=args.max_flows,
+        min_gain=args.min_gain, duration=args.duration,
+        **test_kwargs(args)
+    )
+
+    test.run()
+    print(test.csv_result)
+
+
+if __name__ == '__main__':
+    sys.exit(run_netperf_streams())
@@ -0,0 +1,140 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Network interface, NIC queue, and per-CPU packet counters."""
+
+import re
+
+SAMPLE_COMMAND = (
+    'date +%s.%N;'
+    ' cat /sys/class/net/{0}/statistics/rx_packets'
+    ' /sys/class/net/{0}/statistics/tx_packets;'
+    ' echo ==softnet==; cat /proc/net/softnet_stat;'
+    ' echo ==interrupts==; cat /proc/interrupts'
+)
+SECTION = re.compile(r'^==(softnet|interrupts)==$')
+
+# share of all interrupts or packets above which a queue or CPU is busy
+BUSY_SHARE = 0.05
+
+
+class NetSample:
+    """Packet counters of an interface and its host at one time.
+
+    The NIC queues are the interrupt lines named after the interface,
+    such as ens5-Tx-Rx-0 for ENA, with their count summed over CPUs.
+    Softnet counters come per CPU from /proc/net/softnet_stat: packets
+    processed, dropped because the backlog was full, and times the
+    softirq ran out of budget with work left.
+    """
+
+    def __init__(self, text, interface):
+        """Parse the output of the sample command."""
+        lines = text.strip().splitlines()
+        self.time = float(lines[0])
+        self.rx_packets = int(lines[1])
+        self.tx_packets = int(lines[2])
+        self.processed = []
+        self.dropped = []
+        self.squeezed = []
+        self.queues = {}
+
+        section = None
+        for line in lines[3:]:
+            match = SECTION.match(line.strip())
+            if match:
+                section = match.group(1)
+            elif section == 'softnet' and line.strip():
+                fields = [int(field, 16) for field in line.split()]
+                self.processed.append(fields[0])
+                self.dropped.append(fields[1])
+                self.squeezed.append(fields[2])
+            elif section == 'interrupts' and interface in line:
+                fields = line.split()
+                self.queues[fields[-1]] = sum(
+                    int(field) for field in fields[1:] if field.isdigit()
+                )
+
+    @classmethod
+    def take(cls, instance, interface):
+        """Sample the counters of an interface on an instance."""
+        return cls(
+            instance.execute(SAMPLE_COMMAND.format(interface)), interface
+        )
+
+    def since(self, earlier):
+        """Return the counters gained since an earlier sample.
+
+        Returns a dict of the seconds elapsed, packets received and sent
+        per second, interrupts per NIC queue, and packets processed per
+        CPU, with dropped and squeezed totals over all CPUs.
+        """
+        elapsed = self.time - earlier.time
+        return {
+            'elapsed': elapsed,
+            'rx_pps': (self.rx_packets - earlier.rx_packets) / elapsed,
+            'tx_pps': (self.tx_packets - earlier.tx_packets) / elapsed,
+            'queues': [
+                count - earlier.queues.get(name, 0)
+                for name, count in sorted(self.queues.items())
+            ],
+            'processed': _deltas(self.processed, earlier.processed),
+            'dropped': sum(_deltas(self.dropped, earlier.dropped)),
+            'squeezed': sum(_deltas(self.squeezed, earlier.squeezed)),
+        }
+
+
+def start_sampling(instance, interface, start, end):
+    """Sample counters in the background start and end seconds from now."""
+    command = SAMPLE_COMMAND.format(interface)
+    instance.execute(
+        "nohup sh -c 'sleep {start}; ({command}) > netstat.start;"
+        " sleep {wait}; ({command}) > netstat.end' > /dev/null 2>&1 &"
+        " echo $! > netstat.pid".format(
+            start=start, command=command, wait=end - start
+        )
+    )
+
+
+def collect_samples(instance, interface):
+    """Return the counters gained between the background samples.
+
+    Returns None if the sampler has not written both samples yet, such
+    as when the flows ended early. The sampler is stopped either way so
+    it cannot write into the next run.
+    """
+    ready = instance.execute(
+        'test -s netstat.start && test -s netstat.end && echo ready'
+    ).strip()
+    start = end = None
+    if ready:
+        start = NetSample(instance.execute('cat netstat.start'), interface)
+        end = NetSample(instance.execute('cat netstat.end'), interface)
+    instance.execute(
+        'kill $(cat netstat.pid) 2> /dev/null;'
+        ' rm -f netstat.start netstat.end netstat.pid'
+    )
+
+    if not ready:
+        return None
+
+    return end.since(start)
+
+
+def busy(counts, share=BUSY_SHARE):
+    """Return how many counts are at least a share of their total."""
+    total = sum(counts)
+    if not total:
+        return 0
+
+    return sum(1 for count in counts if count >= share * total)
+
+
+def interface_to(instance, address):
+    """Return the name of the interface an instance reaches an address by."""
+    fields = instance.execute('ip -o route get %s' % address).split()
+
+    return fields[fields.index('dev') + 1]
+
+
+def _deltas(values, earlier):
+    """Return the per-item change between two lists of counters."""
+    return [value - before for value, before in zip(values, earlier)]
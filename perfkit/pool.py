@@ -0,0 +1,178 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Pool of provisioned instances shared between iterations and tests."""
+
+import json
+import logging
+import os
+import threading
+
+POLICIES = ['pristine', 'clean', 'warm']
+
+
+class InstancePool:
+    """Hand out provisioned instances and reuse them between uses.
+
+    Instances are keyed by (instance_type, release, image_id). How an
+    instance is returned to the pool depends on the policy of the test
+    that used it:
+
+      * pristine: the instance is deleted and never reused
+      * clean: cloud-init logs are removed and the instance rebooted,
+        the same as bin/reboot-clean.sh without arguments
+      * warm: the home directory is emptied and page cache dropped
+
+    The packages installed on each instance are tracked so a later user
+    only installs what is missing.
+    """
+
+    def __init__(self):
+        """Initialize pool."""
+        self._log = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._keys = {}
+        self._groups = {}
+        self._packages = {}
+        self._updated = set()
+
+        self.path = None
+
+    def acquire(self, key, launch, zone=None, group=None, reuse=True):
+        """Return an idle instance for key or launch a new one.
+
+        If zone or placement group are given only instances launched in
+        them are handed out. Without reuse a new instance is always
+        launched.
+        """
+        with self._lock:
+            idle = self._idle.get(key, []) if reuse else []
+            for instance in idle:
+                if zone and instance.availability_zone != zone:
+                    continue
+                if group and self._groups.get(instance.id) != group:
+                    continue
+
+                idle.remove(instance)
+                self._log.info('reusing instance %s', instance.id)
+                return instance
+
+        instance = launch()
+        with self._lock:
+            self._keys[instance.id] = key
+            self._packages[instance.id] = set()
+            if group:
+                self._groups[instance.id] = group
+
+        return instance
+
+    def release(self, instance, policy):
+        """Reset an instance and return it to the pool."""
+        if policy not in POLICIES:
+            raise ValueError('unknown instance policy: %s' % policy)
+
+        if policy == 'pristine' or instance.id not in self._keys:
+            self.discard(instance)
+            return
+
+        self._log.info('resetting instance %s (%s)', instance.id, policy)
+        instance.execute('sudo rm -rf "$HOME"/*')
+        if policy == 'clean':
+            instance.execute('sudo rm -Rf /var/log/cloud*')
+            instance.restart()
+        else:
+            instance.execute(
+                'sync && echo 3 | sudo tee /proc/sys/vm/drop_caches'
+            )
+
+        with self._lock:
+            self._idle.setdefault(self._keys[instance.id], []).append(
+                instance
+            )
+
+    def discard(self, instance):
+        """Delete an instance and forget about it."""
+        with self._lock:
+            self._keys.pop(instance.id, None)
+            self._groups.pop(instance.id, None)
+            self._packages.pop(instance.id, None)
+            self._updated.discard(instance.id)
+
+        instance.delete()
+
+    def install(self, instance, packages):
+        """Install packages that are not already on the instance."""
+        with self._lock:
+            installed = self._packages.setdefault(instance.id, set())
+            missing = [name for name in packages if name not in installed]
+            update = instance.id not in self._updated
+
+        if update:
+            instance.execute('sudo apt-get update')
+        if missing:
+            instance.execute(
+                'sudo apt-get install --yes %s' % ' '.join(missing)
+            )
+
+        with self._lock:
+            installed.update(missing)
+            self._updated.add(instance.id)
+
+    def drain(self):
+        """Delete idle instances or save them when the pool is persisted."""
+        if self.path:
+            self.save()
+            return
+
+        with self._lock:
+            instances = [
+                instance for idle in self._idle.values() for instance in idle
+            ]
+            self._idle = {}
+
+        for instance in instances:
+            self._log.info('deleting pooled instance %s', instance.id)
+            self.discard(instance)
+
+    def load(self, path, cloud):
+        """Adopt idle instances saved by an earlier run."""
+        self.path = path
+        if not os.path.exists(path):
+            return
+
+        with open(path) as pool_file:
+            entries = json.load(pool_file)
+
+        for entry in entries:
+            instance = cloud.get_instance(entry['id'])
+            key = tuple(entry['key'])
+
+            with self._lock:
+                self._keys[instance.id] = key
+                self._packages[instance.id] = set(entry['packages'])
+                if entry.get('group'):
+                    self._groups[instance.id] = entry['group']
+                if entry['updated']:
+                    self._updated.add(instance.id)
+                self._idle.setdefault(key, []).append(instance)
+
+    def save(self):
+        """Write idle instances to the pool file so they can be reused."""
+        with self._lock:
+            entries = [
+                {
+                    'id': instance.id,
+                    'key': list(key),
+                    'packages': sorted(self._packages[instance.id]),
+                    'group': self._groups.get(instance.id),
+                    'updated': instance.id in self._updated,
+                }
+                for key, idle in self._idle.items() for instance in idle
+            ]
+
+        with open(self.path, 'w') as pool_file:
+            json.dump(entries, pool_file, indent=4)
+
+        self._log.info(
+            'kept %s instances running for reuse, see %s',
+            len(entries), self.path
+        )
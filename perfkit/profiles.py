@@ -0,0 +1,123 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Render fio job files from the shared profile library."""
+
+import configparser
+import os
+import string
+
+PROFILES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    'bin', 'fio', 'profiles.fio'
+)
+
+
+class FioProfiles:
+    """Workload profiles read from a fio job file.
+
+    The library is the same job file bin/run-fio.sh runs. Every section
+    other than global is a workload that can be picked by name and any
+    number of them render into one job file, where their stonewall
+    options make fio run them one after the other.
+    """
+
+    def __init__(self, path=PROFILES_PATH):
+        """Read the profile library."""
+        self.parser = configparser.ConfigParser(
+            allow_no_value=True, delimiters=('=',), interpolation=None
+        )
+        self.parser.optionxform = str
+        with open(path) as library:
+            self.parser.read_file(library)
+
+    @property
+    def names(self):
+        """Return the names of the workload profiles."""
+        return [name for name in self.parser.sections() if name != 'global']
+
+    def render(self, names, target, **options):
+        """Return a job file running the named profiles in order.
+
+        The target maps the FIO_* variables of the library to values and
+        options are set on every workload, overriding the library.
+        """
+        self._check(names)
+
+        lines = self._section('global', {})
+        for name in names:
+            lines.append('')
+            lines.extend(self._section(name, options))
+
+        return string.Template('\n'.join(lines) + '\n').substitute(target)
+
+    def render_devices(self, names, devices, target, **options):
+        """Return a job file running each profile on all devices at once.
+
+        Every device gets its own section, named after the profile and
+        device, and its own job group so fio reports it separately. Only
+        the first device of a profile is a stonewall, so the devices run
+        together while the profiles still run one after the other.
+        """
+        self._check(names)
+
+        lines = self._section('global', {})
+        for name in names:
+            for index, device in enumerate(devices):
+                lines.append('')
+                lines.extend(self._section(
+                    name, dict(options, filename=device),
+                    title='%s-%s' % (name, os.path.basename(device)),
+                    concurrent=index > 0
+                ))
+
+        return string.Template('\n'.join(lines) + '\n').substitute(target)
+
+    def _check(self, names):
+        """Fail on profile names missing from the library."""
+        unknown = set(names) - set(self.names)
+        if unknown:
+            raise ValueError(
+                'unknown fio profiles: %s' % ', '.join(sorted(unknown))
+            )
+
+    def _section(self, name, options, title=None, concurrent=False):
+        """Return the lines of a section with options applied.
+
+        A concurrent section starts a new job group instead of waiting
+        for the previous sections to finish.
+        """
+        values = dict(self.parser.items(name))
+        values.update(
+            (key, None if value is None else str(value))
+            for key, value in options.items()
+        )
+        if concurrent:
+            values.pop('stonewall', None)
+            values['new_group'] = None
+
+        lines = ['[%s]' % (title or name)]
+        for key, value in values.items():
+            lines.append(key if value is None else '%s=%s' % (key, value))
+
+        return lines
+
+
+def device_target(device=None, numjobs=None):
+    """Return the FIO_* variables to test a block device or the boot disk.
+
+    Without a device every job tests its own 1G file in the home
+    directory. I/O is not batched.
+    """
+    if device:
+        return {
+            'FIO_FILENAME': device,
+            'FIO_SIZE': '100%',
+            'FIO_NUMJOBS': numjobs or 32,
+            'FIO_BATCH': 1,
+        }
+
+    return {
+        'FIO_FILENAME': 'fio.test.$jobnum',
+        'FIO_SIZE': '1G',
+        'FIO_NUMJOBS': numjobs or 4,
+        'FIO_BATCH': 1,
+    }
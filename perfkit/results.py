@@ -0,0 +1,108 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Column oriented store of per-iteration test results."""
+
+import array
+import collections
+
+from .stats import summarize
+
+# CSV row label and Summary field, in the order they are reported
+SUMMARY_ROWS = [
+    ('average', 'mean'),
+    ('median', 'median'),
+    ('std dev', 'stdev'),
+    ('min', 'min'),
+    ('p5', 'p5'),
+    ('p95', 'p95'),
+    ('max', 'max'),
+    ('95% CI +/-', 'ci'),
+]
+
+# statistics that need more than one value to mean anything
+SPREAD_FIELDS = ['stdev', 'ci']
+
+
+class ResultTable:
+    """Typed columns of metrics with one row per iteration.
+
+    Each metric is kept in its own array so values are stored unboxed and
+    a column can be summarized without touching the others. Columns are
+    doubles unless a different array typecode is given in types.
+    """
+
+    def __init__(self, columns, types=None):
+        """Initialize empty table with the given column names."""
+        types = types or {}
+        self.columns = collections.OrderedDict(
+            (name, array.array(types.get(name, 'd'))) for name in columns
+        )
+
+    def __len__(self):
+        """Return the number of rows."""
+        for column in self.columns.values():
+            return len(column)
+
+        return 0
+
+    @property
+    def names(self):
+        """Return the column names in order."""
+        return list(self.columns)
+
+    def append(self, row):
+        """Append a row of values given in column order."""
+        if len(row) != len(self.columns):
+            raise ValueError(
+                'expected %s values, got %s' % (len(self.columns), len(row))
+            )
+
+        for column, value in zip(self.columns.values(), row):
+            column.append(value)
+
+    def append_attributes(self, result):
+        """Append a row read from the attributes of a result object."""
+        self.append([getattr(result, name) for name in self.columns])
+
+    def extend(self, other):
+        """Append all rows of a table with the same columns."""
+        if other.names != self.names:
+            raise ValueError('tables have different columns')
+
+        for name, column in self.columns.items():
+            column.extend(other.columns[name])
+
+    def column(self, name):
+        """Return the values of a column."""
+        return self.columns[name]
+
+    def rows(self):
+        """Return the rows as tuples in iteration order."""
+        return list(zip(*self.columns.values()))
+
+    def summary(self, columns=None):
+        """Return summary statistics of every, or the given, column."""
+        return collections.OrderedDict(
+            (name, summarize(self.columns[name]))
+            for name in columns or self.columns
+        )
+
+    def summary_csv(self, precision=3, columns=None):
+        """Return CSV lines with summary statistics of the columns."""
+        if len(self) == 0:
+            return []
+
+        summaries = list(self.summary(columns).values())
+        lines = []
+        for label, field in SUMMARY_ROWS:
+            if field in SPREAD_FIELDS and len(self) < 2:
+                continue
+
+            values = [
+                '%.*f' % (precision, getattr(summary, field))
+                for summary in summaries
+            ]
+            lines.append('%s,%s' % (label, ','.join(values)))
+
+        lines[0] = '\n%s' % lines[0]
+
+        return lines
@@ -0,0 +1,144 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Concurrent iteration scheduler."""
+
+import contextlib
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import botocore
+
+QUOTA_ERRORS = [
+    'InstanceLimitExceeded',
+    'InsufficientInstanceCapacity',
+    'RequestLimitExceeded',
+    'VcpuLimitExceeded',
+]
+
+
+class Scheduler:
+    """Run independent test iterations at the same time.
+
+    At most `parallel` iterations execute at once. Up to `prefetch` more
+    iterations are provisioned in the background so their instances are
+    ready as soon as an execute slot frees up. With `serial` only one
+    iteration executes at a time no matter how many are provisioned.
+
+    When an instance launch hits an account or vCPU quota the number of
+    active iterations is lowered and the launch is retried after an
+    exponential backoff.
+    """
+
+    def __init__(self, parallel=1, prefetch=0, serial=False, backoff=30,
+                 max_backoff=600, retries=8):
+        """Initialize scheduler."""
+        self._log = logging.getLogger(__name__)
+        self._condition = threading.Condition()
+        self._active = 0
+        self._executing = 0
+
+        self.limit = max(1, parallel) + max(0, prefetch)
+        self.execute_limit = 1 if serial else max(1, parallel)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retries = retries
+
+    def run(self, func, iterations, stop=None):
+        """Call func with each iteration index and yield results in order.
+
+        If given, stop is called after each result is consumed. Once it
+        returns true no more iterations are started, while those already
+        running are finished and their results still yielded.
+        """
+        with ThreadPoolExecutor(max_workers=self.limit) as executor:
+            running = {}
+            finished = {}
+            started = 0
+            next_index = 0
+            stopped = False
+
+            try:
+                while True:
+                    while (not stopped and started < iterations and
+                           len(running) < self.limit):
+                        future = executor.submit(
+                            self._run_slot, func, started
+                        )
+                        running[future] = started
+                        started += 1
+
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+                        stopped = stopped or bool(stop and stop())
+
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished[running.pop(future)] = future.result()
+            finally:
+                for future in running:
+                    future.cancel()
+
+    @contextlib.contextmanager
+    def executing(self):
+        """Hold one of the execute slots for the duration of the block."""
+        with self._condition:
+            while self._executing >= self.execute_limit:
+                self._condition.wait()
+            self._executing += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._executing -= 1
+                self._condition.notify_all()
+
+    def launch(self, func):
+        """Call a launch function, backing off on quota errors."""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return func()
+            except botocore.exceptions.ClientError as error:
+                code = error.response['Error']['Code']
+                if code not in QUOTA_ERRORS or attempt == self.retries:
+                    raise
+
+            self._throttle()
+            self._log.warning(
+                'hit %s, retrying launch in %s seconds', code, delay
+            )
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+        return None
+
+    def _run_slot(self, func, index):
+        """Wait for a free slot and run a single iteration."""
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+        try:
+            return func(index)
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def _throttle(self):
+        """Lower the number of concurrent iterations by one."""
+        with self._condition:
+            limit = max(1, self._active - 1)
+            if limit < self.limit:
+                self._log.warning(
+                    'lowering parallel iterations from %s to %s',
+                    self.limit, limit
+                )
+                self.limit = limit
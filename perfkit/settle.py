@@ -0,0 +1,114 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Wait for instances to settle instead of sleeping a fixed time."""
+
+import logging
+import time
+
+SAMPLE_CMD = (
+    'for file in /proc/loadavg /proc/stat /proc/diskstats /proc/net/dev;'
+    ' do cat $file; echo ---; done'
+)
+
+
+class Sample:
+    """Point in time counters of an instance."""
+
+    def __init__(self, output):
+        """Parse the output of SAMPLE_CMD."""
+        self.time = time.time()
+        loadavg, stat, diskstats, netdev = [
+            section.strip() for section in output.split('---')[:4]
+        ]
+
+        # the sampling shell itself is always running
+        self.runnable = int(loadavg.split()[3].split('/')[0]) - 1
+
+        cpu = [int(value) for value in stat.split('\n', 1)[0].split()[1:]]
+        self.cpu_idle = cpu[3] + cpu[4]
+        self.cpu_total = sum(cpu)
+
+        self.io_in_flight = 0
+        for line in diskstats.splitlines():
+            self.io_in_flight += int(line.split()[11])
+
+        self.net_bytes = 0
+        for line in netdev.splitlines()[2:]:
+            name, values = line.split(':', 1)
+            if name.strip() != 'lo':
+                values = values.split()
+                self.net_bytes += int(values[0]) + int(values[8])
+
+
+class Settler:
+    """Sample an instance until it is quiet or a condition is met.
+
+    An instance is quiet when between two samples CPU use, in-flight disk
+    I/O, runnable tasks, and network throughput are all below thresholds.
+    Every wait is bounded by max_wait seconds and logs how long it took.
+    """
+
+    def __init__(self, max_wait=120, interval=5, cpu=0.05, runnable=1,
+                 net_rate=1000000):
+        """Initialize settler."""
+        self._log = logging.getLogger(__name__)
+        self.max_wait = max_wait
+        self.interval = interval
+        self.cpu = cpu
+        self.runnable = runnable
+        self.net_rate = net_rate
+
+    def quiet(self, instance):
+        """Wait for the instance to be quiet, return seconds waited.
+
+        A max_wait of 0 turns the wait off.
+        """
+        if not self.max_wait:
+            return 0
+
+        previous = Sample(instance.execute(SAMPLE_CMD))
+
+        def is_quiet():
+            """Take another sample and compare against the last one."""
+            nonlocal previous
+            current = Sample(instance.execute(SAMPLE_CMD))
+            result = self._quiet(previous, current)
+            previous = current
+            return result
+
+        return self.wait_for(is_quiet, 'instance to be quiet')
+
+    def wait_for(self, condition, description, max_wait=None,
+                 interval=None):
+        """Poll condition until it is true, return seconds waited.
+
+        Returns None if the condition was still false after max_wait.
+        """
+        if max_wait is None:
+            max_wait = self.max_wait
+        start = time.time()
+
+        while time.time() - start < max_wait:
+            time.sleep(interval or self.interval)
+            if condition():
+                waited = time.time() - start
+                self._log.info('waited %.1fs for %s', waited, description)
+                return waited
+
+        self._log.warning(
+            'gave up waiting for %s after %ss', description, max_wait
+        )
+        return None
+
+    def _quiet(self, previous, current):
+        """Decide if the instance was quiet between two samples."""
+        elapsed = current.time - previous.time
+        cpu_total = current.cpu_total - previous.cpu_total
+        cpu_busy = cpu_total - (current.cpu_idle - previous.cpu_idle)
+        net_rate = (current.net_bytes - previous.net_bytes) / elapsed
+
+        return (
+            cpu_busy <= self.cpu * max(cpu_total, 1) and
+            current.runnable <= self.runnable and
+            current.io_in_flight == 0 and
+            net_rate <= self.net_rate
+        )
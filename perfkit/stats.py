@@ -0,0 +1,103 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Statistics helpers for test results."""
+
+import collections
+import math
+
+# two-sided 95% critical values of Student's t distribution by degrees of
+# freedom, beyond the table the normal approximation is close enough
+T_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+Summary = collections.namedtuple(
+    'Summary', 'count mean median stdev p5 p95 min max ci'
+)
+
+
+def t_critical(freedom):
+    """Return the 95% t critical value for the degrees of freedom."""
+    if freedom <= len(T_95):
+        return T_95[freedom - 1]
+
+    return 1.960
+
+
+def percentile(ordered, percent):
+    """Return a percentile of sorted values, interpolating linearly."""
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (
+        position - lower
+    )
+
+
+def summarize(values):
+    """Return all summary statistics of values.
+
+    The values are sorted once for the order statistics and the mean and
+    variance are accumulated in the same walk over the sorted values, so
+    the cost is a single sort per column however many statistics are
+    reported. The ci field is the 95% confidence interval half width.
+    NaN marks a missing value and is left out.
+    """
+    if not values:
+        raise ValueError('no values to summarize')
+
+    ordered = sorted(value for value in values if not math.isnan(value))
+    count = len(ordered)
+    if not count:
+        return Summary(0, *[math.nan] * 8)
+
+    # Welford's online mean and sum of squared deviations
+    mean = 0.0
+    squares = 0.0
+    for index, value in enumerate(ordered, 1):
+        delta = value - mean
+        mean += delta / index
+        squares += delta * (value - mean)
+
+    if count > 1:
+        stdev = math.sqrt(squares / (count - 1))
+        half_width = t_critical(count - 1) * stdev / math.sqrt(count)
+    else:
+        stdev = 0.0
+        half_width = math.inf
+
+    return Summary(
+        count, mean, percentile(ordered, 50), stdev,
+        percentile(ordered, 5), percentile(ordered, 95),
+        ordered[0], ordered[-1], half_width
+    )
+
+
+def confidence_interval(values):
+    """Return the mean and 95% confidence interval half width."""
+    summary = summarize(values)
+
+    return summary.mean, summary.ci
+
+
+def jain_fairness(values):
+    """Return Jain's fairness index, 1 when all values are equal.
+
+    The index falls towards 1/n as a single value dominates.
+    """
+    squares = sum(value * value for value in values)
+    if not squares:
+        return 1.0
+
+    return sum(values) ** 2 / (len(values) * squares)
+
+
+def relative_width(values):
+    """Return the width of the 95% confidence interval relative to mean."""
+    mean, half_width = confidence_interval(values)
+    if not mean:
+        return math.inf
+
+    return 2 * half_width / abs(mean)
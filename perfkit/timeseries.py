@@ -0,0 +1,174 @@
+# This file is part of perfkit. See LICENSE file for license information.
+"""Time series of interval samples and change-point detection."""
+
+import array
+import math
+import re
+
+from parse.log.netperf import interim_results
+
+from .stats import summarize
+
+FIO_DIRECTIONS = {'read': 0, 'write': 1, 'trim': 2}
+FIO_LOG_HEADER = re.compile(r'^==> (?:.*/)?(.+)_(iops|bw)\.\d+\.log <==$')
+
+
+class TimeSeries:
+    """Values sampled at increasing times in seconds."""
+
+    def __init__(self, times=(), values=()):
+        """Initialize series from optional times and values."""
+        self.times = array.array('d', times)
+        self.values = array.array('d', values)
+
+    def __len__(self):
+        """Return the number of samples."""
+        return len(self.values)
+
+    def append(self, time, value):
+        """Add a sample."""
+        self.times.append(time)
+        self.values.append(value)
+
+    def mean(self, start=0, end=None):
+        """Return the mean of the values between two indexes."""
+        values = self.values[start:end]
+        if not values:
+            return float('nan')
+
+        return math.fsum(values) / len(values)
+
+    def change_point(self, min_size=3):
+        """Return the index that best splits the series into two levels.
+
+        The split minimizes the squared error of fitting each side with
+        its mean, found in one pass with prefix sums. Each side keeps at
+        least min_size samples; None if the series is too short.
+        """
+        count = len(self.values)
+        if count < 2 * min_size:
+            return None
+
+        total = math.fsum(self.values)
+        total_squares = math.fsum(value * value for value in self.values)
+
+        best, best_error = None, math.inf
+        left = left_squares = 0.0
+        for index in range(1, count):
+            value = self.values[index - 1]
+            left += value
+            left_squares += value * value
+            if index < min_size or count - index < min_size:
+                continue
+
+            right = total - left
+            right_squares = total_squares - left_squares
+            error = (
+                left_squares - left * left / index +
+                right_squares - right * right / (count - index)
+            )
+            if error < best_error:
+                best, best_error = index, error
+
+        return best
+
+    def phases(self, min_drop=0.2, min_size=3):
+        """Split the series into a burst and a baseline phase.
+
+        Returns the index where the baseline starts when the mean after
+        the best change point is at least min_drop lower than before it,
+        otherwise None as the series held one level.
+        """
+        index = self.change_point(min_size)
+        if index is None:
+            return None
+
+        burst = self.mean(0, index)
+        baseline = self.mean(index)
+        if burst <= 0 or baseline > (1 - min_drop) * burst:
+            return None
+
+        return index
+
+    def dips(self, min_drop=0.2):
+        """Return the index ranges where values dip and then recover.
+
+        A dip is a run of values at least min_drop below the median that
+        ends with a value back above that level. A drop that lasts to the
+        end of the series is a collapse, found by phases, not a dip.
+        """
+        if not self.values:
+            return []
+
+        threshold = (1 - min_drop) * summarize(self.values).median
+        ranges = []
+        start = None
+        for index, value in enumerate(self.values):
+            if value < threshold and start is None:
+                start = index
+            elif value >= threshold and start is not None:
+                ranges.append((start, index))
+                start = None
+
+        return ranges
+
+    def to_csv(self, header='time,value'):
+        """Return the series as CSV lines."""
+        lines = [header]
+        for time, value in zip(self.times, self.values):
+            lines.append('%g,%g' % (time, value))
+
+        return '\n'.join(lines)
+
+    @classmethod
+    def from_fio_log(cls, text, interval, direction='read'):
+        """Return the series of a direction in averaged fio logs.
+
+        The logs of all jobs may be concatenated, samples of the same
+        interval are summed so the series is the total of every job.
+        Times are in seconds from the start of the run.
+        """
+        wanted = FIO_DIRECTIONS[direction]
+        buckets = {}
+        for line in text.splitlines():
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) < 3 or not fields[0].isdigit():
+                continue
+            if int(fields[2]) != wanted:
+                continue
+
+            bucket = int(round(int(fields[0]) / interval))
+            buckets[bucket] = buckets.get(bucket, 0) + int(fields[1])
+
+        series = cls()
+        for bucket in sorted(buckets):
+            series.append(bucket * interval / 1000, buckets[bucket])
+
+        return series
+
+    @classmethod
+    def from_netperf_interim(cls, text):
+        """Return the series of interim results in netperf -D output."""
+        series = cls()
+        for time, value in interim_results(text):
+            series.append(time, value)
+
+        return series
+
+
+def split_fio_logs(text):
+    """Split tail output of fio logs into text by job name and log type.
+
+    Logs of the same job and type, one per cloned job, are joined.
+    """
+    logs = {}
+    key = None
+    for line in text.splitlines():
+        match = FIO_LOG_HEADER.match(line.strip())
+        if match:
+            key = match.groups()
+            logs.setdefault(key, [])
+        elif key and line.strip():
+            logs[key].append(line)
+
+    return {key: '\n'.join(lines) for key, lines in logs.items()}